@@ -0,0 +1,100 @@
+import json
+import mmap
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+from startup import lazy_import
+
+TEXT_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+METADATA_IDS_FILE = "metadata_ids.npy"
+METADATA_FILE = "metadata.json"
+
+
+class ChunkArenaWriter:
+    """Append chunk text to one contiguous UTF-8 file and intern repeated metadata.
+
+    Chunks of the same page share one metadata entry (source URL, title, ...)
+    instead of each carrying its own dict.
+    """
+
+    def __init__(self, directory: Any):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._text_file = open(self.directory / TEXT_FILE, "wb")
+        self._position = 0
+        self._offsets = array("q")
+        self._metadata_ids = array("i")
+        self._metadata: List[Dict[str, Any]] = []
+        self._metadata_index: Dict[str, int] = {}
+
+    def add(self, text: str, metadata: Dict[str, Any]) -> int:
+        """Append one chunk and return its row number."""
+        data = text.encode("utf-8")
+        self._text_file.write(data)
+        self._offsets.extend((self._position, len(data)))
+        self._position += len(data)
+
+        key = json.dumps(metadata, sort_keys=True)
+        if key not in self._metadata_index:
+            self._metadata_index[key] = len(self._metadata)
+            self._metadata.append(metadata)
+        self._metadata_ids.append(self._metadata_index[key])
+        return len(self._metadata_ids) - 1
+
+    def close(self) -> None:
+        """Flush the text file and write the offset and metadata tables."""
+        self._text_file.close()
+        np.save(self.directory / OFFSETS_FILE, np.frombuffer(self._offsets, dtype=np.int64).reshape(-1, 2))
+        np.save(self.directory / METADATA_IDS_FILE, np.frombuffer(self._metadata_ids, dtype=np.int32))
+        with open(self.directory / METADATA_FILE, "w", encoding="utf-8") as f:
+            json.dump(self._metadata, f)
+
+    def __enter__(self) -> "ChunkArenaWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ChunkArena:
+    """Read-only, memory-mapped view of chunks written by ``ChunkArenaWriter``.
+
+    Text stays in the page cache until a row is requested, and ``Document``
+    objects are only built for the rows actually returned to the caller.
+    """
+
+    def __init__(self, directory: Any):
+        self.directory = Path(directory)
+        self.offsets = np.load(self.directory / OFFSETS_FILE, mmap_mode="r")
+        self.metadata_ids = np.load(self.directory / METADATA_IDS_FILE, mmap_mode="r")
+        with open(self.directory / METADATA_FILE, encoding="utf-8") as f:
+            self.metadata_table = json.load(f)
+
+        self._text_file = open(self.directory / TEXT_FILE, "rb")
+        # mmap refuses empty files, and an empty arena has no text to read anyway
+        if (self.directory / TEXT_FILE).stat().st_size:
+            self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._text = b""
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def text(self, row: int) -> str:
+        offset, length = self.offsets[row]
+        return self._text[offset:offset + length].decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        return dict(self.metadata_table[self.metadata_ids[row]])
+
+    def document(self, row: int) -> Any:
+        """Build a LangChain ``Document`` for one row."""
+        Document = lazy_import("langchain_core.documents", "Document")
+        return Document(page_content=self.text(row), metadata=self.metadata(row))
+
+    def close(self) -> None:
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._text_file.close()
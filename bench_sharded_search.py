@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sharded_vectorstore import ShardedVectorStore
+
+
+def run_benchmark(num_chunks: int, dimension: int, shard_counts, num_queries: int, concurrency: int, k: int):
+    """Measure query throughput of a sharded index as the shard count grows."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((num_chunks, dimension), dtype=np.float32)
+    records = [{"page_content": f"chunk {i}", "metadata": {"source": "bench"}} for i in range(num_chunks)]
+    queries = rng.standard_normal((num_queries, dimension), dtype=np.float32)
+
+    print(f"{num_chunks} chunks x {dimension} dims, {num_queries} queries, concurrency {concurrency}, k={k}, "
+          f"{os.cpu_count()} CPU cores")
+    print(f"{'shards':>6} {'queries/s':>12} {'mean ms':>10}")
+    baseline = None
+    for num_shards in shard_counts:
+        with tempfile.TemporaryDirectory() as index_dir:
+            store = ShardedVectorStore.from_embeddings(records, vectors, index_dir, num_shards)
+            try:
+                # Warm up workers and page in the shards before timing
+                store.search_by_vectors(queries[:concurrency], k)
+
+                def search(query):
+                    start = time.perf_counter()
+                    store.search_by_vectors(query, k)
+                    return time.perf_counter() - start
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    latencies = list(pool.map(search, queries))
+                elapsed = time.perf_counter() - start
+            finally:
+                store.close()
+
+        throughput = num_queries / elapsed
+        baseline = baseline or throughput
+        print(f"{num_shards:>6} {throughput:>12.1f} {1000 * np.mean(latencies):>10.2f}   ({throughput / baseline:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sharded vector search throughput")
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.chunks, args.dimension, args.shards, args.queries, args.concurrency, args.k)
+
+
+if __name__ == "__main__":
+    main()
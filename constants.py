@@ -18,4 +18,18 @@ DEFAULT_TEMPERATURE = 0
 DEFAULT_TOP_K = 3
 
 # Types
-JSON_FORMAT = "json"
\ No newline at end of file
+JSON_FORMAT = "json"
+
+# Service settings
+DEFAULT_SERVICE_HOST = "127.0.0.1"
+DEFAULT_SERVICE_PORT = 8080
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_BATCH_WINDOW_MS = 20
+DEFAULT_MAX_QUEUE_SIZE = 64
+DEFAULT_LLM_CONCURRENCY = 4
+DEFAULT_REQUEST_TIMEOUT = 300
+
+# Scheduler settings, highest priority first
+PRIORITY_CLASSES = ("urgent", "normal", "batch")
+DEFAULT_PRIORITY = "normal"
+DEFAULT_TENANT = "default"
@@ -1,15 +1,96 @@
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List
+import copy
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from startup import lazy_import
 
+TOKENIZER_ENCODING = "gpt2"
+TOKEN_LENGTH_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str):
+    return lazy_import("tiktoken").get_encoding(encoding_name)
+
+
+@lru_cache(maxsize=TOKEN_LENGTH_CACHE_SIZE)
+def token_length(text: str) -> int:
+    """Count tiktoken tokens exactly like ``from_tiktoken_encoder``, caching repeated windows."""
+    encoding = _get_encoding(TOKENIZER_ENCODING)
+    return len(encoding.encode(text, allowed_special=set(), disallowed_special="all"))
 
-def load_documents(urls: List[str], chunk_size: int, chunk_overlap: int):
-    """Load and split documents from URLs."""
-    docs = [WebBaseLoader(url).load() for url in urls]
-    docs_list = [item for sublist in docs for item in sublist]
 
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int, chunk_overlap: int, length_function: Callable[[str], int] = token_length):
+    """Return a per-process splitter that measures length with the cached token counter."""
+    RecursiveCharacterTextSplitter = lazy_import("langchain_text_splitters", "RecursiveCharacterTextSplitter")
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
+        chunk_overlap=chunk_overlap,
+        length_function=length_function
     )
-    return text_splitter.split_documents(docs_list)
\ No newline at end of file
+
+
+def _split_text(
+        text: str,
+        metadata: Dict[str, Any],
+        chunk_size: int,
+        chunk_overlap: int,
+        length_function: Callable[[str], int]
+) -> List[Tuple[str, Dict[str, Any]]]:
+    splitter = get_text_splitter(chunk_size, chunk_overlap, length_function)
+    return [(chunk, metadata) for chunk in splitter.split_text(text)]
+
+
+def iter_documents(urls: Iterable[str]) -> Iterator[Any]:
+    """Yield documents one URL at a time instead of loading the whole corpus up front."""
+    WebBaseLoader = lazy_import("langchain_community.document_loaders", "WebBaseLoader")
+    for url in urls:
+        yield from WebBaseLoader(url).lazy_load()
+
+
+def iter_chunks(
+        documents: Iterable[Any],
+        chunk_size: int,
+        chunk_overlap: int,
+        processes: Optional[int] = None,
+        length_function: Callable[[str], int] = token_length
+) -> Iterator[Any]:
+    """Split a stream of documents into chunks, in document order.
+
+    Documents are split independently, so the chunks are the same as
+    ``from_tiktoken_encoder(...).split_documents(docs_list)`` would produce.
+    With more than one process, at most ``2 * processes`` documents are in
+    flight at a time, keeping memory flat regardless of corpus size.
+    ``length_function`` must be a module-level function so worker processes
+    can import it.
+    """
+    Document = lazy_import("langchain_core.documents", "Document")
+    processes = os.cpu_count() if processes is None else processes
+
+    def to_documents(splits):
+        return (Document(page_content=chunk, metadata=copy.deepcopy(metadata)) for chunk, metadata in splits)
+
+    if processes <= 1:
+        for doc in documents:
+            yield from to_documents(_split_text(doc.page_content, doc.metadata, chunk_size, chunk_overlap, length_function))
+        return
+
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as executor:
+        pending = deque()
+        for doc in documents:
+            pending.append(executor.submit(
+                _split_text, doc.page_content, doc.metadata, chunk_size, chunk_overlap, length_function
+            ))
+            if len(pending) >= 2 * processes:
+                yield from to_documents(pending.popleft().result())
+        while pending:
+            yield from to_documents(pending.popleft().result())
+
+
+def load_documents(urls: List[str], chunk_size: int, chunk_overlap: int, processes: Optional[int] = None):
+    """Load and split documents from URLs."""
+    return list(iter_chunks(iter_documents(urls), chunk_size, chunk_overlap, processes))
@@ -1,17 +1,109 @@
-from typing import Dict, Any, Optional
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union
 from loguru import logger
 from json_utils import JSONProcessor, format_grading_response
 
+CLAIM_CACHE_SIZE = 10000
+CLAIM_GRADING_WORKERS = 4
+VERDICT_LOG_MARKER = "Grader verdict: "
+VERDICT_LOG_MAX_CHARS = 4000
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split an answer into sentence-level claims."""
+    return [sentence.strip() for sentence in re.split(r'(?<=[.!?])\s+', text.strip()) if sentence.strip()]
+
+
+def _digest(text: str) -> str:
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class VerdictCache:
+    """Thread-safe LRU cache of claim verdicts keyed by (sentence hash, supporting-chunk ids)."""
+
+    def __init__(self, maxsize: int = CLAIM_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, Tuple[str, ...]], Dict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, Tuple[str, ...]]) -> Optional[Dict[str, str]]:
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is not None:
+                self._entries.move_to_end(key)
+            return verdict
+
+    def put(self, key: Tuple[str, Tuple[str, ...]], verdict: Dict[str, str]) -> None:
+        with self._lock:
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# Shared across GradingProcessor instances so regenerated answers reuse verdicts
+CLAIM_VERDICT_CACHE = VerdictCache()
+
 
 class GradingProcessor:
-    def __init__(self):
+    def __init__(self, verdict_cache: Optional[VerdictCache] = None, pregrader: Any = None):
         JSONProcessor.setup_logging()
         self.json_processor = JSONProcessor()
+        self.verdict_cache = verdict_cache if verdict_cache is not None else CLAIM_VERDICT_CACHE
+        self.pregrader = pregrader
+
+    @staticmethod
+    def _log_verdict(grader: str, context: str, text: str, verdict: Dict[str, Any]) -> None:
+        """Log an LLM verdict with its inputs so pregrader.py can learn from it."""
+        record = {
+            "grader": grader,
+            "context": context[:VERDICT_LOG_MAX_CHARS],
+            "text": text[:VERDICT_LOG_MAX_CHARS],
+            "binary_score": str(verdict.get("binary_score", "")).lower()
+        }
+        logger.info(f"{VERDICT_LOG_MARKER}{json.dumps(record)}")
+
+    def _pre_grade(self, grader: str, context: str, text: str) -> Optional[Dict[str, str]]:
+        """Answer from the local pre-grader when it is confident; None means ask the LLM."""
+        if self.pregrader is None:
+            return None
+        try:
+            prediction = self.pregrader.predict(grader, context, text)
+        except Exception as e:
+            logger.warning(f"Pre-grader failed for {grader}, escalating to LLM: {str(e)}")
+            return None
+        if prediction is None:
+            logger.debug(f"Pre-grader not confident for {grader}, escalating to LLM")
+            return None
+        binary_score, probability = prediction
+        logger.info(f"Pre-grader answered {grader} grading: {binary_score} ({probability:.2f})")
+        return format_grading_response(
+            str(binary_score),
+            f"Local pre-grader verdict with confidence {probability:.2f}"
+        )
 
     def grade_document(self, client: Any, document: str, question: str) -> Dict[str, str]:
         """Grade document relevance with enhanced error handling."""
         logger.info(f"Grading document for question: {question[:100]}...")
 
+        pre_graded = self._pre_grade("document", document, question)
+        if pre_graded is not None:
+            return pre_graded
+
         prompt = f"""Here is the retrieved document: \n\n {document} \n\n Here is the user question: \n\n {question}.
 
         Return ONLY a single JSON object with these two keys:
@@ -26,6 +118,7 @@ class GradingProcessor:
 
             json_result = self.json_processor.process_llm_response(result.content)
             logger.info("Successfully processed document grading")
+            self._log_verdict("document", document, question, json_result)
             return json_result
 
         except Exception as e:
@@ -46,6 +139,10 @@ class GradingProcessor:
         logger.debug(f"Documents length: {len(documents)}")
         logger.debug(f"Answer length: {len(answer)}")
 
+        pre_graded = self._pre_grade("hallucination", documents, answer)
+        if pre_graded is not None:
+            return pre_graded
+
         prompt = f"""FACTS: \n\n {documents} \n\n STUDENT ANSWER: {answer}
 
         Return ONLY a single JSON object with these two keys:
@@ -60,6 +157,7 @@ class GradingProcessor:
 
             json_result = self.json_processor.process_llm_response(result.content)
             logger.info("Successfully processed hallucination grading")
+            self._log_verdict("hallucination", documents, answer, json_result)
             return json_result
 
         except Exception as e:
@@ -69,6 +167,123 @@ class GradingProcessor:
                 f"Error during hallucination check: {str(e)}"
             )
 
+    def grade_hallucination_claims(
+            self,
+            client: Any,
+            documents: Union[str, List[str]],
+            answer: str
+    ) -> Dict[str, Any]:
+        """Grade for hallucinations sentence by sentence, reusing cached claim verdicts.
+
+        Only sentences without a verdict for the same supporting chunks are sent
+        to the LLM, together in one prompt; the overall ``binary_score`` is
+        "yes" only if every claim is supported.
+        """
+        chunks = [documents] if isinstance(documents, str) else list(documents)
+        chunk_ids = tuple(sorted(_digest(chunk) for chunk in chunks))
+        sentences = split_sentences(answer)
+        if not sentences:
+            # Nothing to grade claim by claim; let the whole-answer grader judge it as before
+            logger.warning("Answer has no sentences, falling back to whole-answer hallucination grading")
+            return self.grade_hallucination(client, "\n\n".join(chunks), answer)
+        logger.info(f"Starting claim-level hallucination grading of {len(sentences)} sentences")
+
+        verdicts: Dict[int, Dict[str, str]] = {}
+        unseen = []
+        for index, sentence in enumerate(sentences):
+            cached = self.verdict_cache.get((_digest(sentence), chunk_ids))
+            if cached is not None:
+                verdicts[index] = cached
+            else:
+                unseen.append(index)
+        logger.debug(f"Reused {len(verdicts)} cached claim verdicts, grading {len(unseen)} new claims")
+
+        facts = "\n\n".join(chunks)
+        escalated = []
+        for index in unseen:
+            pre_graded = self._pre_grade("claim", facts, sentences[index])
+            if pre_graded is not None:
+                verdicts[index] = pre_graded
+            else:
+                escalated.append(index)
+
+        if escalated:
+            try:
+                graded = self._grade_claims(client, facts, [sentences[i] for i in escalated])
+            except Exception as e:
+                logger.error(f"Error during claim-level hallucination check: {str(e)}")
+                return format_grading_response(
+                    "no",
+                    f"Error during hallucination check: {str(e)}"
+                )
+            for index, verdict in zip(escalated, graded):
+                verdicts[index] = verdict
+                self._log_verdict("claim", facts, sentences[index], verdict)
+
+        for index in unseen:
+            self.verdict_cache.put((_digest(sentences[index]), chunk_ids), verdicts[index])
+
+        claims = [
+            {
+                "sentence": sentence,
+                "binary_score": verdicts[index]["binary_score"],
+                "explanation": verdicts[index]["explanation"],
+                "cached": index not in unseen
+            }
+            for index, sentence in enumerate(sentences)
+        ]
+        unsupported = [claim for claim in claims if claim["binary_score"] != "yes"]
+        if unsupported:
+            explanation = "Unsupported claims: " + " ".join(
+                f'"{claim["sentence"]}" ({claim["explanation"]})' for claim in unsupported
+            )
+        else:
+            explanation = f"All {len(claims)} claims are supported by the facts."
+
+        result = format_grading_response("no" if unsupported else "yes", explanation)
+        result["claims"] = claims
+        logger.info(f"Claim-level hallucination grading finished: {len(unsupported)} unsupported of {len(claims)}")
+        return result
+
+    def _grade_claims(self, client: Any, documents: str, sentences: List[str]) -> List[Dict[str, str]]:
+        """Grade several claims against the facts in a single LLM call."""
+        numbered = "\n".join(f"{i + 1}. {sentence}" for i, sentence in enumerate(sentences))
+        prompt = f"""FACTS: \n\n {documents} \n\n CLAIMS FROM STUDENT ANSWER: \n\n {numbered}
+
+        Return ONLY a single JSON object with one key, verdicts, holding a list with one entry per claim:
+        {{"verdicts": [{{"id": 1, "binary_score": "yes", "explanation": "..."}}]}}
+        1. id: The claim number
+        2. binary_score: Must be exactly "yes" or "no" indicating if the claim contains ONLY information from the facts
+        3. explanation: A brief explanation of why
+
+        Important: Return only the JSON object. Do not include any additional analysis."""
+
+        result = client.llm.invoke(prompt)
+        logger.debug(f"LLM response for claim grading: {result.content[:200]}...")
+        parsed = self.json_processor.process_llm_response(result.content)
+
+        by_id = {}
+        for entry in parsed.get("verdicts", []):
+            try:
+                by_id[int(entry["id"])] = format_grading_response(
+                    str(entry["binary_score"]),
+                    str(entry.get("explanation", ""))
+                )
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Skipping malformed claim verdict: {entry}")
+
+        missing = [i for i in range(len(sentences)) if i + 1 not in by_id]
+        if missing and len(sentences) == 1:
+            raise ValueError("No verdict returned for claim")
+        if missing:
+            # Re-ask for the claims the batch answer skipped, one call each, in parallel
+            logger.warning(f"No verdict returned for claims {[i + 1 for i in missing]}, grading them individually")
+            with ThreadPoolExecutor(max_workers=min(CLAIM_GRADING_WORKERS, len(missing))) as pool:
+                graded = pool.map(lambda i: self._grade_claims(client, documents, [sentences[i]])[0], missing)
+                for i, verdict in zip(missing, graded):
+                    by_id[i + 1] = verdict
+        return [by_id[i + 1] for i in range(len(sentences))]
+
     def grade_answer(
             self,
             client: Any,
@@ -78,6 +293,10 @@ class GradingProcessor:
         """Grade answer quality with enhanced error handling."""
         logger.info(f"Grading answer for question: {question[:100]}...")
 
+        pre_graded = self._pre_grade("answer", question, answer)
+        if pre_graded is not None:
+            return pre_graded
+
         prompt = f"""QUESTION: \n\n {question} \n\n STUDENT ANSWER: {answer}
 
         Return ONLY a single JSON object with these two keys:
@@ -92,6 +311,7 @@ class GradingProcessor:
 
             json_result = self.json_processor.process_llm_response(result.content)
             logger.info("Successfully processed answer grading")
+            self._log_verdict("answer", question, answer, json_result)
             return json_result
 
         except Exception as e:
@@ -1,14 +1,9 @@
 import os
 from typing import Dict, Any, Optional
 from loguru import logger
-from langchain_ollama import ChatOllama
-from langchain.schema import SystemMessage, HumanMessage
-from langchain_community.vectorstores import SKLearnVectorStore
-from langchain_nomic.embeddings import NomicEmbeddings
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from graders import GradingProcessor
 from json_utils import JSONProcessor
+from startup import PROFILE, lazy_import, start_warmup
 
 # Set environment variables
 os.environ["USER_AGENT"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
@@ -26,18 +21,21 @@ logger.add(
 # Model configuration
 MODEL_NAME = "llama3.2" 
 TEMPERATURE = 0
+EMBEDDING_MODEL = "nomic-embed-text-v1.5"
 
 
 class RAGClient:
     """Wrapper class for RAG processing."""
 
     def __init__(self):
+        ChatOllama = lazy_import("langchain_ollama", "ChatOllama")
         self.llm = ChatOllama(model=MODEL_NAME, temperature=TEMPERATURE)
 
     def invoke(self, prompt: str) -> str:
         """Invoke the LLM with a prompt."""
         try:
             if isinstance(prompt, str):
+                HumanMessage = lazy_import("langchain.schema", "HumanMessage")
                 messages = [HumanMessage(content=prompt)]
             else:
                 messages = prompt
@@ -48,25 +46,45 @@ class RAGClient:
             raise
 
 
-def setup_vectorstore(urls):
-    """Initialize the vector store with documents."""
+def create_embedding():
+    """Create the local Nomic embedder."""
+    NomicEmbeddings = lazy_import("langchain_nomic.embeddings", "NomicEmbeddings")
+    return NomicEmbeddings(model=EMBEDDING_MODEL, inference_mode="local")
+
+
+def setup_vectorstore(urls, embedding=None, num_shards=0, index_dir="index", chunk_workers=None):
+    """Initialize the vector store with documents.
+
+    With ``num_shards`` >= 1 the index is written to ``index_dir`` and searched
+    by a pool of worker processes instead of a single in-process store, and
+    chunks stream from the loader through the splitter into embedding
+    without the corpus ever being held in memory.
+    """
     try:
-        # Load documents
-        docs = [WebBaseLoader(url).load() for url in urls]
-        docs_list = [item for sublist in docs for item in sublist]
+        from data_loader import iter_chunks, iter_documents
 
-        # Split documents
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        doc_splits = text_splitter.split_documents(docs_list)
+        # Load and split documents, one document at a time across chunk_workers processes
+        chunks = iter_chunks(iter_documents(urls), chunk_size=1000, chunk_overlap=200, processes=chunk_workers)
 
         # Create vectorstore
-        vectorstore = SKLearnVectorStore.from_documents(
-            documents=doc_splits,
-            embedding=NomicEmbeddings(model="nomic-embed-text-v1.5", inference_mode="local")
-        )
+        if num_shards >= 1:
+            from sharded_vectorstore import ShardedVectorStore
+            with PROFILE.phase("load, split and index documents"):
+                vectorstore = ShardedVectorStore.from_documents(
+                    documents=chunks,
+                    embedding=embedding or create_embedding(),
+                    index_dir=index_dir,
+                    num_shards=num_shards
+                )
+        else:
+            SKLearnVectorStore = lazy_import("langchain_community.vectorstores", "SKLearnVectorStore")
+            with PROFILE.phase("load and split documents"):
+                doc_splits = list(chunks)
+            with PROFILE.phase("build index"):
+                vectorstore = SKLearnVectorStore.from_documents(
+                    documents=doc_splits,
+                    embedding=embedding or create_embedding()
+                )
 
         return vectorstore
     except Exception as e:
@@ -81,7 +99,11 @@ def process_question(
         context_variables: Optional[Dict] = None
 ) -> Dict[str, Any]:
     """Process a question through the RAG pipeline."""
-    grading_processor = GradingProcessor()
+    context_variables = context_variables or {}
+    grading_processor = GradingProcessor(
+        verdict_cache=context_variables.get("verdict_cache"),
+        pregrader=context_variables.get("pregrader")
+    )
     logger.info(f"Processing question: {question}")
 
     try:
@@ -100,6 +122,7 @@ def process_question(
             if grade_result.get("binary_score") == "yes":
                 logger.info("Retrieved document is relevant")
                 content_source = doc_txt
+                content_chunks = [doc_txt]
             else:
                 logger.info("Document not relevant, performing web search")
                 try:
@@ -107,9 +130,11 @@ def process_question(
                     search_results = search_web(question)
                     logger.debug(f"Found {len(search_results)} search results")
                     content_source = "\n".join(search_results)
+                    content_chunks = search_results
                 except Exception as e:
                     logger.error(f"Web search failed: {str(e)}")
                     content_source = doc_txt  # Fallback to retrieved document
+                    content_chunks = [doc_txt]
         else:
             logger.info("No documents retrieved, performing web search")
             try:
@@ -117,6 +142,7 @@ def process_question(
                 search_results = search_web(question)
                 logger.debug(f"Found {len(search_results)} search results")
                 content_source = "\n".join(search_results)
+                content_chunks = search_results
             except Exception as e:
                 logger.error(f"Web search failed: {str(e)}")
                 return {
@@ -140,9 +166,9 @@ def process_question(
 
             # Check for hallucinations
             logger.info("Checking for hallucinations")
-            hallucination_result = grading_processor.grade_hallucination(
+            hallucination_result = grading_processor.grade_hallucination_claims(
                 client,
-                content_source,
+                content_chunks,
                 generated_answer
             )
             logger.debug(f"Hallucination check result: {hallucination_result}")
@@ -197,15 +223,25 @@ def main():
         # Initialize components
         logger.info("Initializing components")
         client = RAGClient()
+        embedding = create_embedding()
+
+        # Load the models in the background while documents are fetched and split
+        warmup_threads = start_warmup(client.llm, embedding)
 
         urls = [
                 "https://www.un.org/en/climatechange/what-is-climate-change",
                 "https://www.noaa.gov/education/resource-collections/marine-life"
         ]
 
-        vectorstore = setup_vectorstore(urls)
+        vectorstore = setup_vectorstore(urls, embedding)
         retriever = vectorstore.as_retriever(k=3)
 
+        for thread in warmup_threads:
+            thread.join()
+        startup_report = PROFILE.format_report()
+        logger.info(startup_report)
+        print(startup_report)
+
         # Test questions
         test_questions = [
             "what is climate change",
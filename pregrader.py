@@ -0,0 +1,206 @@
+import argparse
+import json
+import math
+import pickle
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from graders import VERDICT_LOG_MARKER, VERDICT_LOG_MAX_CHARS
+
+DEFAULT_LOG_FILES = ("json_processing.log", "rag_processing.log")
+DEFAULT_MODEL_PATH = "pregraders.pkl"
+DEFAULT_CONFIDENCE = 0.9
+MIN_TRAINING_SAMPLES = 20
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what "
+    "which who why will with".split()
+)
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+
+def extract_features(context: str, text: str, embedding: Any = None) -> List[float]:
+    """Lexical-overlap features of ``text`` against ``context``, plus embedding similarity when available.
+
+    ``context`` is what the grader checks against (retrieved document or
+    facts) and ``text`` is what is being graded (question, answer or claim).
+    Both are cut to ``VERDICT_LOG_MAX_CHARS`` first, as in the logged
+    training verdicts, so serving sees the same inputs as training.
+    """
+    context, text = context[:VERDICT_LOG_MAX_CHARS], text[:VERDICT_LOG_MAX_CHARS]
+    context_tokens, text_tokens = _tokens(context), _tokens(text)
+    context_set, text_set = set(context_tokens), set(text_tokens)
+    context_bigrams = set(zip(context_tokens, context_tokens[1:]))
+    text_bigrams = set(zip(text_tokens, text_tokens[1:]))
+    text_numbers = set(re.findall(r"\d+(?:\.\d+)?", text))
+    context_numbers = set(re.findall(r"\d+(?:\.\d+)?", context))
+
+    features = [
+        len(text_set & context_set) / len(text_set) if text_set else 1.0,
+        len(text_set & context_set) / len(text_set | context_set) if text_set | context_set else 0.0,
+        len(text_bigrams & context_bigrams) / len(text_bigrams) if text_bigrams else 1.0,
+        len(text_numbers - context_numbers) / len(text_numbers) if text_numbers else 0.0,
+        math.log1p(len(text_tokens)),
+        math.log1p(len(context_tokens)),
+    ]
+    if embedding is not None:
+        context_vector, text_vector = embedding.embed_documents([context, text])
+        dot = sum(a * b for a, b in zip(context_vector, text_vector))
+        norm = math.sqrt(sum(a * a for a in context_vector)) * math.sqrt(sum(b * b for b in text_vector))
+        features.append(dot / norm if norm else 0.0)
+    return features
+
+
+def read_verdicts(log_files: Iterable[str]) -> List[Dict[str, str]]:
+    """Collect structured grader verdicts from the processing logs.
+
+    Older log lines only carry truncated responses without the grader inputs,
+    so only lines written by ``GradingProcessor`` with the verdict marker are
+    usable.
+    """
+    records = []
+    for log_file in log_files:
+        if not Path(log_file).exists():
+            logger.warning(f"Log file not found: {log_file}")
+            continue
+        with open(log_file, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                _, marker, payload = line.partition(VERDICT_LOG_MARKER)
+                if not marker:
+                    continue
+                try:
+                    record = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("binary_score") in ("yes", "no"):
+                    records.append(record)
+    return records
+
+
+class PreGrader:
+    """Small per-grader classifiers that answer confident verdicts without an LLM call."""
+
+    def __init__(self, models: Dict[str, Any], confidence: float = DEFAULT_CONFIDENCE,
+                 use_embedding: bool = False, embedding: Any = None):
+        self.models = models
+        self.confidence = confidence
+        self.use_embedding = use_embedding
+        self.embedding = embedding
+
+    def predict(self, grader: str, context: str, text: str) -> Optional[Tuple[str, float]]:
+        """Return (binary_score, probability) if the model is confident, else None to escalate."""
+        model = self.models.get(grader)
+        if model is None or (self.use_embedding and self.embedding is None):
+            return None
+        # The service always hands over its embedder; only models trained with it expect the extra feature
+        embedding = self.embedding if self.use_embedding else None
+        probabilities = model.predict_proba([extract_features(context, text, embedding)])[0]
+        best = max(range(len(probabilities)), key=lambda i: probabilities[i])
+        if probabilities[best] < self.confidence:
+            return None
+        return str(model.classes_[best]), float(probabilities[best])
+
+    def save(self, path: Any) -> None:
+        with open(path, "wb") as f:
+            pickle.dump({"models": self.models, "confidence": self.confidence,
+                         "use_embedding": self.use_embedding}, f)
+
+    @classmethod
+    def load(cls, path: Any, embedding: Any = None, confidence: Optional[float] = None) -> "PreGrader":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        return cls(state["models"], confidence or state["confidence"], state["use_embedding"], embedding)
+
+
+def train(
+        records: List[Dict[str, str]],
+        confidence: float = DEFAULT_CONFIDENCE,
+        embedding: Any = None,
+        test_size: float = 0.25
+) -> Tuple[PreGrader, Dict[str, Dict[str, float]]]:
+    """Fit one logistic regression per grader and evaluate gating on a held-out split."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    by_grader: Dict[str, List[Dict[str, str]]] = {}
+    for record in records:
+        by_grader.setdefault(record["grader"], []).append(record)
+
+    models, report = {}, {}
+    for grader, grader_records in sorted(by_grader.items()):
+        labels = [record["binary_score"] for record in grader_records]
+        if len(grader_records) < MIN_TRAINING_SAMPLES or min(labels.count(label) for label in ("yes", "no")) < 2:
+            logger.warning(f"Skipping {grader} pre-grader: {len(grader_records)} samples, labels {sorted(set(labels))}")
+            continue
+
+        features = [extract_features(record["context"], record["text"], embedding) for record in grader_records]
+        x_train, x_test, y_train, y_test = train_test_split(
+            features, labels, test_size=test_size, random_state=0, stratify=labels
+        )
+        model = make_pipeline(StandardScaler(), LogisticRegression(class_weight="balanced"))
+        model.fit(x_train, y_train)
+        models[grader] = model
+
+        probabilities = model.predict_proba(x_test)
+        predictions = model.classes_[probabilities.argmax(axis=1)]
+        confident = probabilities.max(axis=1) >= confidence
+        answered = int(confident.sum())
+        report[grader] = {
+            "samples": len(grader_records),
+            "held_out": len(y_test),
+            "escalation_rate": 1 - answered / len(y_test),
+            "agreement_when_confident": (
+                sum(p == y for p, y, c in zip(predictions, y_test, confident) if c) / answered if answered else float("nan")
+            ),
+            "agreement_overall": sum(p == y for p, y in zip(predictions, y_test)) / len(y_test),
+        }
+
+    return PreGrader(models, confidence, embedding is not None, embedding), report
+
+
+def format_report(report: Dict[str, Dict[str, float]], confidence: float) -> str:
+    lines = [f"Pre-grader evaluation on held-out data (confidence threshold {confidence}):"]
+    lines.append(f"  {'grader':<15} {'samples':>8} {'held out':>9} {'escalated':>10} {'agree (gated)':>14} {'agree (all)':>12}")
+    for grader, metrics in report.items():
+        lines.append(
+            f"  {grader:<15} {metrics['samples']:>8} {metrics['held_out']:>9} {metrics['escalation_rate']:>10.1%} "
+            f"{metrics['agreement_when_confident']:>14.1%} {metrics['agreement_overall']:>12.1%}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Train pre-graders from logged LLM verdicts and report escalation rate and agreement."""
+    parser = argparse.ArgumentParser(description="Train local pre-graders from logged grader verdicts")
+    parser.add_argument("--logs", nargs="+", default=list(DEFAULT_LOG_FILES), help="Log files to read verdicts from")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH, help="Where to save the trained pre-graders")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE,
+                        help="Minimum probability for answering without the LLM")
+    parser.add_argument("--embeddings", action="store_true", help="Add Nomic embedding similarity as a feature")
+    args = parser.parse_args()
+
+    records = read_verdicts(args.logs)
+    print(f"Read {len(records)} grader verdicts from {', '.join(args.logs)}")
+
+    embedding = None
+    if args.embeddings:
+        from main import create_embedding
+        embedding = create_embedding()
+
+    pregrader, report = train(records, confidence=args.confidence, embedding=embedding)
+    if not pregrader.models:
+        print(f"Not enough verdicts to train any pre-grader (need {MIN_TRAINING_SAMPLES} per grader with both labels)")
+        return
+    pregrader.save(args.output)
+    print(format_report(report, args.confidence))
+    print(f"Saved pre-graders for {', '.join(pregrader.models)} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from loguru import logger
 from graders import GradingProcessor
 from json_utils import JSONProcessor
 
 
+def _search_web(question: str, context_variables: Dict) -> List[str]:
+    """Run a web search, waiting on ``search_rate_limiter`` from the context when set.
+
+    A ``search_fn`` in the context replaces Tavily, e.g. for trace recording and replay.
+    """
+    search_fn = context_variables.get("search_fn")
+    if search_fn is None:
+        from search import search_web
+        search_fn = search_web
+    rate_limiter = context_variables.get("search_rate_limiter")
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    return search_fn(question)
+
+
 def process_question(
         question: str,
         retriever: Any,
@@ -23,7 +38,11 @@ def process_question(
         Dict containing processing results and any error information
     """
     # Initialize processors
-    grading_processor = GradingProcessor()
+    context_variables = context_variables or {}
+    grading_processor = GradingProcessor(
+        verdict_cache=context_variables.get("verdict_cache"),
+        pregrader=context_variables.get("pregrader")
+    )
     logger.info(f"Processing question: {question}")
 
     try:
@@ -42,23 +61,25 @@ def process_question(
             if grade_result.get("binary_score") == "yes":
                 logger.info("Retrieved document is relevant")
                 content_source = doc_txt
+                content_chunks = [doc_txt]
             else:
                 logger.info("Document not relevant, performing web search")
                 try:
-                    from search import search_web
-                    search_results = search_web(question)
+                    search_results = _search_web(question, context_variables)
                     logger.debug(f"Found {len(search_results)} search results")
                     content_source = "\n".join(search_results)
+                    content_chunks = search_results
                 except Exception as e:
                     logger.error(f"Web search failed: {str(e)}")
                     content_source = doc_txt  # Fallback to retrieved document
+                    content_chunks = [doc_txt]
         else:
             logger.info("No documents retrieved, performing web search")
             try:
-                from search import search_web
-                search_results = search_web(question)
+                search_results = _search_web(question, context_variables)
                 logger.debug(f"Found {len(search_results)} search results")
                 content_source = "\n".join(search_results)
+                content_chunks = search_results
             except Exception as e:
                 logger.error(f"Web search failed: {str(e)}")
                 return {
@@ -82,9 +103,9 @@ def process_question(
 
             # Check for hallucinations
             logger.info("Checking for hallucinations")
-            hallucination_result = grading_processor.grade_hallucination(
+            hallucination_result = grading_processor.grade_hallucination_claims(
                 client,
-                content_source,
+                content_chunks,
                 generated_answer
             )
             logger.debug(f"Hallucination check result: {hallucination_result}")
@@ -0,0 +1,285 @@
+import argparse
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+from graders import VerdictCache
+from processor import process_question
+from startup import lazy_import
+from tracing import content_id, open_trace
+
+MISS_EXPLANATION = "No recorded response for this prompt"
+CLAIM_PROMPT_MARKER = "CLAIMS FROM STUDENT ANSWER:"
+
+
+def miss_response(prompt: str) -> str:
+    """Neutral grading reply shaped like the answer the prompt asks for.
+
+    Claim-batch prompts get one numbered verdict per claim, so a miss does
+    not make the grader re-ask each claim on its own.
+    """
+    if CLAIM_PROMPT_MARKER in prompt:
+        claims = prompt.split(CLAIM_PROMPT_MARKER, 1)[1].split("Return ONLY", 1)[0]
+        ids = sorted({int(number) for number in re.findall(r"^\s*(\d+)\. ", claims, flags=re.MULTILINE)})
+        return json.dumps({"verdicts": [
+            {"id": claim, "binary_score": "yes", "explanation": MISS_EXPLANATION} for claim in ids
+        ]})
+    return json.dumps({"binary_score": "yes", "explanation": MISS_EXPLANATION})
+
+
+def load_traces(path: str) -> Dict[str, Any]:
+    """Read chunk and request records from a trace file.
+
+    A trace cut short by a killed worker (a truncated gzip stream or a
+    half-written last line) keeps every complete record before the cut.
+    """
+    chunks, requests = {}, []
+    with open_trace(path, "r") as f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping incomplete trace record in {path}")
+                    continue
+                if record["type"] == "chunk":
+                    chunks[record["id"]] = record
+                elif record["type"] == "request":
+                    requests.append(record)
+        except EOFError:
+            logger.warning(f"Trace {path} ends without a gzip end-of-stream marker, using the records read so far")
+    return {"chunks": chunks, "requests": requests}
+
+
+class ReplayResponse:
+    """Minimal stand-in for a LangChain chat message."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class ReplayBackends:
+    """Stand-in LLM, retriever and search that answer from recorded traces.
+
+    Responses are looked up by prompt (or query) and delayed by the recorded
+    latency, scaled by ``latency_scale``. Prompts that were never recorded,
+    e.g. after a prompt template change, count as misses and get a neutral
+    grading response of the prompt's shape after the mean recorded LLM
+    latency.
+    """
+
+    def __init__(self, traces: Dict[str, Any], latency_scale: float = 1.0):
+        self.chunks = traces["chunks"]
+        self.latency_scale = latency_scale
+        self._llm = defaultdict(deque)
+        self._search = defaultdict(deque)
+        self._retrieval = defaultdict(deque)
+        self._lock = threading.Lock()
+        self.misses = defaultdict(int)
+
+        llm_latencies = []
+        for request in traces["requests"]:
+            for event in request["events"]:
+                if event["stage"] == "llm":
+                    self._llm[content_id(event["prompt"])].append((event["response"], event["latency"]))
+                    llm_latencies.append(event["latency"])
+                elif event["stage"] == "search":
+                    self._search[event["query"]].append((event["results"], event["latency"]))
+                elif event["stage"] == "retrieval":
+                    self._retrieval[event["query"]].append((event["chunk_ids"], event["latency"]))
+        self._mean_llm_latency = sum(llm_latencies) / len(llm_latencies) if llm_latencies else 0.0
+
+    def _take(self, table: Dict[str, deque], key: str, stage: str) -> Optional[Any]:
+        with self._lock:
+            recorded = table.get(key)
+            if not recorded:
+                self.misses[stage] += 1
+                return None
+            # Rotate so repeated replays of the same trace keep finding responses
+            value = recorded.popleft()
+            recorded.append(value)
+            return value
+
+    def _sleep(self, latency: float) -> None:
+        if latency > 0 and self.latency_scale > 0:
+            time.sleep(latency * self.latency_scale)
+
+    def invoke_llm(self, prompt: Any) -> ReplayResponse:
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        recorded = self._take(self._llm, content_id(prompt), "llm")
+        response, latency = recorded if recorded else (miss_response(prompt), self._mean_llm_latency)
+        self._sleep(latency)
+        return ReplayResponse(response)
+
+    def search(self, query: str) -> List[str]:
+        recorded = self._take(self._search, query, "search")
+        results, latency = recorded if recorded else ([], 0.0)
+        self._sleep(latency)
+        return results
+
+    def retrieve(self, question: str) -> List[Any]:
+        Document = lazy_import("langchain_core.documents", "Document")
+        recorded = self._take(self._retrieval, question, "retrieval")
+        chunk_ids, latency = recorded if recorded else ([], 0.0)
+        self._sleep(latency)
+        return [
+            Document(page_content=self.chunks[chunk]["text"], metadata=self.chunks[chunk]["metadata"])
+            for chunk in chunk_ids if chunk in self.chunks
+        ]
+
+    def client(self) -> Any:
+        backends = self
+
+        class _LLM:
+            def invoke(self, prompt, *args, **kwargs):
+                return backends.invoke_llm(prompt)
+
+        class _Client:
+            llm = _LLM()
+
+            def invoke(self, prompt, *args, **kwargs):
+                return backends.invoke_llm(prompt)
+
+        return _Client()
+
+    def retriever(self) -> Any:
+        backends = self
+
+        class _Retriever:
+            def invoke(self, question):
+                return backends.retrieve(question)
+
+            def batch(self, questions):
+                return [backends.retrieve(question) for question in questions]
+
+        return _Retriever()
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_replay(
+        traces: Dict[str, Any],
+        rate: Optional[float] = None,
+        concurrency: int = 4,
+        repeat: int = 1,
+        latency_scale: float = 1.0,
+        process_fn: Callable[..., Dict[str, Any]] = process_question,
+        submit_fn: Optional[Callable[[str], Any]] = None,
+        backends: Optional[ReplayBackends] = None,
+        verdict_cache: Optional[VerdictCache] = None
+) -> Dict[str, Any]:
+    """Drive recorded questions through the pipeline against stand-in backends.
+
+    With ``rate`` set, arrivals are open-loop at that many requests per
+    second and latency includes time spent waiting for a free worker;
+    otherwise requests are sent back to back. ``submit_fn`` replaces the
+    direct ``process_fn`` call, e.g. ``MicroBatcher.submit`` returning a future.
+    Claim verdicts are cached in ``verdict_cache`` (a private one by default),
+    which is cleared at the start of every pass over the trace so each pass
+    sends the claim prompts a fresh recording session would.
+    """
+    backends = backends or ReplayBackends(traces, latency_scale)
+    verdict_cache = verdict_cache if verdict_cache is not None else VerdictCache()
+    client, retriever = backends.client(), backends.retriever()
+    context_variables = {"search_fn": backends.search, "verdict_cache": verdict_cache}
+    questions = [request["question"] for request in traces["requests"]]
+
+    def run(question: str, arrival: float) -> Dict[str, Any]:
+        if submit_fn is not None:
+            result = submit_fn(question).result()
+        else:
+            result = process_fn(question=question, retriever=retriever, client=client,
+                                context_variables=context_variables)
+        return {"latency": time.perf_counter() - arrival, "error": "error" in result}
+
+    outcomes = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for index in range(len(questions) * repeat):
+            question = questions[index % len(questions)]
+            if index % len(questions) == 0:
+                verdict_cache.clear()
+            arrival = time.perf_counter()
+            if rate:
+                arrival = start + index / rate
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(run, question, arrival))
+        for future in futures:
+            outcomes.append(future.result())
+    elapsed = time.perf_counter() - start
+
+    latencies = [outcome["latency"] for outcome in outcomes]
+    return {
+        "requests": len(outcomes),
+        "errors": sum(outcome["error"] for outcome in outcomes),
+        "elapsed": elapsed,
+        "throughput": len(outcomes) / elapsed if elapsed else 0.0,
+        "latency_p50": _percentile(latencies, 0.50),
+        "latency_p95": _percentile(latencies, 0.95),
+        "latency_p99": _percentile(latencies, 0.99),
+        "latency_max": max(latencies, default=0.0),
+        "misses": dict(backends.misses)
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    return "\n".join([
+        f"Replayed {summary['requests']} requests in {summary['elapsed']:.2f}s "
+        f"({summary['throughput']:.2f} req/s, {summary['errors']} errors)",
+        f"Latency p50 {summary['latency_p50'] * 1000:.1f} ms, p95 {summary['latency_p95'] * 1000:.1f} ms, "
+        f"p99 {summary['latency_p99'] * 1000:.1f} ms, max {summary['latency_max'] * 1000:.1f} ms",
+        f"Backend misses (not in trace): {summary['misses'] or 'none'}"
+    ])
+
+
+def main():
+    """Replay recorded traces offline and report throughput and tail latency."""
+    parser = argparse.ArgumentParser(description="Replay recorded RAG traces against stand-in backends")
+    parser.add_argument("trace", help="Trace file written by tracing.TraceRecorder (.jsonl or .jsonl.gz)")
+    parser.add_argument("--rate", type=float, help="Arrival rate in requests/s (default: back to back)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests processed at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the trace this many times")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiply recorded backend latencies (0 disables the delays)")
+    parser.add_argument("--mode", choices=("direct", "service"), default="direct",
+                        help="Call process_question directly or go through the service micro-batcher")
+    args = parser.parse_args()
+
+    traces = load_traces(args.trace)
+    logger.info(f"Loaded {len(traces['requests'])} requests and {len(traces['chunks'])} chunks from {args.trace}")
+
+    backends = ReplayBackends(traces, args.latency_scale)
+    verdict_cache = VerdictCache()
+    submit_fn, batcher = None, None
+    if args.mode == "service":
+        from service import MicroBatcher
+        batcher = MicroBatcher(
+            backends.retriever(), backends.client(),
+            max_queue_size=0, llm_concurrency=args.concurrency,
+            context_variables={"search_fn": backends.search, "verdict_cache": verdict_cache}
+        ).start()
+        submit_fn = batcher.submit
+
+    try:
+        summary = run_replay(traces, args.rate, args.concurrency, args.repeat, args.latency_scale,
+                             submit_fn=submit_fn, backends=backends, verdict_cache=verdict_cache)
+    finally:
+        if batcher is not None:
+            batcher.stop()
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+from constants import PRIORITY_CLASSES, DEFAULT_PRIORITY, DEFAULT_TENANT
+
+WAIT_SAMPLES = 1000
+
+_LIMITER_WAIT = threading.local()
+
+
+def limiter_wait_time() -> float:
+    """Seconds the calling thread has spent waiting on token buckets so far.
+
+    Lets callers that time a rate-limited backend call subtract the
+    throttling and keep only the backend's own latency.
+    """
+    return getattr(_LIMITER_WAIT, "seconds", 0.0)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter for one backend (LLM, embedder or search)."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take tokens if they are available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """Block until tokens are available; returns False if ``timeout`` expires first."""
+        if tokens > self.capacity:
+            # The bucket never refills past capacity, so this would wait forever
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of capacity {self.capacity}")
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        try:
+            while True:
+                with self._lock:
+                    self._refill()
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        return True
+                    wait = (tokens - self._tokens) / self.rate
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                time.sleep(wait)
+        finally:
+            _LIMITER_WAIT.seconds = limiter_wait_time() + time.monotonic() - start
+
+
+class _RateLimitedLLM:
+    def __init__(self, llm: Any, bucket: TokenBucket):
+        self._llm = llm
+        self._bucket = bucket
+
+    def invoke(self, *args, **kwargs):
+        self._bucket.acquire()
+        return self._llm.invoke(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+
+class RateLimitedClient:
+    """Wrap an LLM client so every ``invoke`` and ``llm.invoke`` waits on a token bucket."""
+
+    def __init__(self, client: Any, bucket: TokenBucket):
+        self._client = client
+        self._bucket = bucket
+        self.llm = _RateLimitedLLM(client.llm, bucket)
+
+    def invoke(self, *args, **kwargs):
+        self._bucket.acquire()
+        return self._client.invoke(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class RateLimitedRetriever:
+    """Wrap a retriever so each query embedding waits on the embedder token bucket."""
+
+    def __init__(self, retriever: Any, bucket: TokenBucket):
+        self._retriever = retriever
+        self._bucket = bucket
+
+    def invoke(self, question: str):
+        self._bucket.acquire()
+        return self._retriever.invoke(question)
+
+    def batch(self, questions):
+        for _ in questions:
+            self._bucket.acquire()
+        if hasattr(self._retriever, "batch"):
+            return self._retriever.batch(questions)
+        return [self._retriever.invoke(question) for question in questions]
+
+
+class _ClassQueue:
+    """Weighted fair queue across tenants within one priority class."""
+
+    def __init__(self, tenant_weights: Dict[str, float]):
+        self.tenant_weights = tenant_weights
+        self.heap = []
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+
+    def push(self, item: Any, sequence: int) -> None:
+        tenant = getattr(item, "tenant", DEFAULT_TENANT)
+        weight = self.tenant_weights.get(tenant, 1.0)
+        # A tenant that has been idle restarts at the current virtual time, so
+        # it cannot bank credit, and a busy tenant queues behind its own items.
+        finish = max(self.virtual_time, self.last_finish.get(tenant, 0.0)) + 1.0 / weight
+        self.last_finish[tenant] = finish
+        heapq.heappush(self.heap, (finish, sequence, item))
+
+    def pop(self) -> Any:
+        finish, _, item = heapq.heappop(self.heap)
+        self.virtual_time = finish
+        return item
+
+
+class FairQueue:
+    """Priority and fair-share queue with the ``queue.Queue`` interface used by ``MicroBatcher``.
+
+    Classes in ``PRIORITY_CLASSES`` are served strictly in order, so urgent
+    reports never wait behind backfill; within a class, tenants share the
+    backend in proportion to their weights. Items need ``priority``,
+    ``tenant`` and ``enqueued_at`` attributes.
+    """
+
+    def __init__(self, maxsize: int = 0, tenant_weights: Optional[Dict[str, float]] = None):
+        self.maxsize = maxsize
+        self._classes = {name: _ClassQueue(tenant_weights or {}) for name in PRIORITY_CLASSES}
+        self._size = 0
+        self._sequence = itertools.count()
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in PRIORITY_CLASSES}
+        self._served = {name: 0 for name in PRIORITY_CLASSES}
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._not_full = threading.Condition(self._mutex)
+
+    def qsize(self) -> int:
+        with self._not_empty:
+            return self._size
+
+    def put_nowait(self, item: Any) -> None:
+        self.put(item, block=False)
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None) -> None:
+        """Add an item, waiting for space like ``queue.Queue.put``.
+
+        Raises ``queue.Full`` if no space frees up (immediately when ``block``
+        is False) and ``ValueError`` for unknown classes.
+        """
+        priority = getattr(item, "priority", DEFAULT_PRIORITY)
+        if priority not in self._classes:
+            raise ValueError(f"Unknown priority class: {priority}")
+        with self._not_full:
+            if self.maxsize > 0 and not self._not_full.wait_for(
+                    lambda: self._size < self.maxsize, timeout=timeout if block else 0):
+                raise queue.Full
+            self._classes[priority].push(item, next(self._sequence))
+            self._size += 1
+            self._not_empty.notify()
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        """Remove the next item by priority class, then by weighted fair share."""
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._size > 0, timeout=timeout if block else 0):
+                raise queue.Empty
+            for name in PRIORITY_CLASSES:
+                class_queue = self._classes[name]
+                if class_queue.heap:
+                    item = class_queue.pop()
+                    self._size -= 1
+                    self._not_full.notify()
+                    return item
+
+    def mark_started(self, item: Any) -> None:
+        """Record an item's queue wait once its processing actually starts."""
+        name = getattr(item, "priority", DEFAULT_PRIORITY)
+        with self._mutex:
+            self._served[name] += 1
+            self._waits[name].append(time.monotonic() - item.enqueued_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and recent wait times (ms) from enqueue to processing start, per priority class."""
+        with self._not_empty:
+            stats = {}
+            for name in PRIORITY_CLASSES:
+                waits = sorted(self._waits[name])
+                stats[name] = {
+                    "queued": len(self._classes[name].heap),
+                    "served": self._served[name],
+                    "wait_ms_mean": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                    "wait_ms_p95": 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "wait_ms_max": 1000 * waits[-1] if waits else 0.0
+                }
+            return stats
+
+
+def build_rate_limiters(rate_limits: Dict[str, Dict[str, float]]) -> Dict[str, TokenBucket]:
+    """Create token buckets from the ``scheduler.rate_limits`` config section."""
+    return {
+        backend: TokenBucket(limits["rate"], limits.get("burst"))
+        for backend, limits in (rate_limits or {}).items()
+        if limits and limits.get("rate")
+    }
@@ -0,0 +1,433 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, TCPServer
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+from processor import process_question
+from config_loader import load_config
+from startup import PROFILE, start_warmup
+from vectorstore import BatchRetriever
+from scheduler import FairQueue, RateLimitedClient, RateLimitedRetriever, build_rate_limiters, limiter_wait_time
+from constants import (
+    CONFIG_PATH,
+    DEFAULT_TOP_K,
+    DEFAULT_PRIORITY,
+    DEFAULT_TENANT,
+    DEFAULT_SERVICE_HOST,
+    DEFAULT_SERVICE_PORT,
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_BATCH_WINDOW_MS,
+    DEFAULT_MAX_QUEUE_SIZE,
+    DEFAULT_LLM_CONCURRENCY,
+    DEFAULT_REQUEST_TIMEOUT
+)
+
+
+@dataclass
+class WorkItem:
+    """A single moderation item waiting in the service queue."""
+    question: str
+    tenant: str = DEFAULT_TENANT
+    priority: str = DEFAULT_PRIORITY
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class PrefetchedRetriever:
+    """Retriever stand-in that returns documents fetched ahead of time for one batch.
+
+    ``prefetch_latency`` is this item's share of the batch retrieval time, so
+    trace recording can report the real embedding and search cost.
+    """
+
+    def __init__(self, documents: List[Any], prefetch_latency: float = 0.0):
+        self.documents = documents
+        self.prefetch_latency = prefetch_latency
+
+    def invoke(self, question: str) -> List[Any]:
+        return self.documents
+
+
+class MicroBatcher:
+    """Queue moderation items and process them in small batches.
+
+    Items arriving within ``batch_window_ms`` of each other are retrieved
+    together (one embedding call and a vector search per item with
+    ``vectorstore.BatchRetriever``) and then graded concurrently, at most
+    ``llm_concurrency`` at a time. Grader prompts are not merged across
+    items, since Ollama serves one prompt per request. A batch never holds
+    more items than there are free LLM slots. When the LLM backend is
+    saturated the queue fills up and ``submit`` raises ``queue.Full`` so
+    callers can shed load. Pass a ``scheduler.FairQueue`` as ``work_queue``
+    to order items by priority class and tenant share instead of arrival.
+    """
+
+    def __init__(
+            self,
+            retriever: Any,
+            client: Any,
+            process_fn: Callable[..., Dict[str, Any]] = process_question,
+            max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+            batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+            max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+            llm_concurrency: int = DEFAULT_LLM_CONCURRENCY,
+            work_queue: Any = None,
+            context_variables: Optional[Dict] = None,
+            trace_recorder: Any = None
+    ):
+        self.retriever = retriever
+        self.client = client
+        self.process_fn = process_fn
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.llm_concurrency = llm_concurrency
+        self.work_queue = work_queue if work_queue is not None else queue.Queue(maxsize=max_queue_size)
+        self.context_variables = context_variables or {}
+        self.trace_recorder = trace_recorder
+
+        self._slots = threading.Semaphore(llm_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=llm_concurrency)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"accepted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0,
+                       "batches": 0, "in_flight": 0}
+
+    def start(self) -> "MicroBatcher":
+        """Start the batching loop in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting batches, wait for in-flight items to finish and close the trace recorder."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        if self.trace_recorder is not None:
+            self.trace_recorder.close()
+
+    def submit(self, question: str, tenant: str = DEFAULT_TENANT, priority: str = DEFAULT_PRIORITY) -> Future:
+        """Queue a question; raises ``queue.Full`` when the service is saturated."""
+        item = WorkItem(question=question, tenant=tenant, priority=priority)
+        try:
+            self.work_queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning(f"Queue full, rejecting question: {question[:100]}...")
+            raise
+        with self._lock:
+            self._stats["accepted"] += 1
+        return item.future
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and processing counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.work_queue.qsize()
+        stats["max_queue_size"] = self.work_queue.maxsize
+        stats["llm_concurrency"] = self.llm_concurrency
+        if hasattr(self.work_queue, "stats"):
+            stats["priority_classes"] = self.work_queue.stats()
+        return stats
+
+    def _collect_batch(self) -> List[WorkItem]:
+        """Block for one item, then gather more until the window closes or the batch is full.
+
+        Each item is only taken from the queue once an LLM slot is held for
+        it, so items stay in the queue, where priority ordering applies,
+        until they can actually run. A slot is still held for every item
+        returned.
+        """
+        if not self._slots.acquire(timeout=0.5):
+            return []
+        try:
+            first = self.work_queue.get(timeout=0.5)
+        except queue.Empty:
+            self._slots.release()
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._slots.acquire(blocking=False):
+                break
+            try:
+                batch.append(self.work_queue.get(timeout=remaining))
+            except queue.Empty:
+                self._slots.release()
+                break
+        return batch
+
+    def _retrieve(self, questions: List[str]) -> Optional[List[List[Any]]]:
+        """Retrieve documents for a whole batch in one call when the retriever supports it."""
+        try:
+            if hasattr(self.retriever, "batch"):
+                return self.retriever.batch(questions)
+            return [self.retriever.invoke(question) for question in questions]
+        except Exception as e:
+            logger.error(f"Batch retrieval failed, falling back to per-item retrieval: {str(e)}")
+            return None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            # Items whose caller gave up (e.g. an HTTP timeout) give their slot back unprocessed
+            cancelled = [item for item in batch if item.future.cancelled()]
+            for _ in cancelled:
+                self._slots.release()
+            if cancelled:
+                with self._lock:
+                    self._stats["cancelled"] += len(cancelled)
+                batch = [item for item in batch if not any(item is other for other in cancelled)]
+            if not batch:
+                continue
+
+            with self._lock:
+                self._stats["batches"] += 1
+            logger.debug(f"Dispatching batch of {len(batch)} items")
+
+            # Embedder rate-limit waits are queueing, not retrieval cost, so leave them out
+            start, waited = time.perf_counter(), limiter_wait_time()
+            documents = self._retrieve([item.question for item in batch])
+            retrieval_latency = (time.perf_counter() - start - (limiter_wait_time() - waited)) / len(batch)
+            for index, item in enumerate(batch):
+                if documents is not None:
+                    retriever = PrefetchedRetriever(documents[index], retrieval_latency)
+                else:
+                    retriever = self.retriever
+                with self._lock:
+                    self._stats["in_flight"] += 1
+                self._executor.submit(self._process, item, retriever)
+
+    def _process(self, item: WorkItem, retriever: Any) -> None:
+        try:
+            if not item.future.set_running_or_notify_cancel():
+                return
+            if hasattr(self.work_queue, "mark_started"):
+                self.work_queue.mark_started(item)
+            result = self.process_fn(
+                question=item.question,
+                retriever=retriever,
+                client=self.client,
+                context_variables=self.context_variables
+            )
+            item.future.set_result(result)
+            with self._lock:
+                self._stats["completed"] += 1
+        except Exception as e:
+            logger.error(f"Error processing queued question: {str(e)}")
+            item.future.set_exception(e)
+            with self._lock:
+                self._stats["failed"] += 1
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+            self._slots.release()
+
+
+class ModerationRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end for the micro-batcher."""
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/queue":
+            self._send_json(200, self.server.batcher.stats())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/moderate":
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            question = payload["question"]
+            tenant = str(payload.get("tenant", DEFAULT_TENANT))
+            priority = str(payload.get("priority", DEFAULT_PRIORITY))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": "Invalid request", "details": str(e)})
+            return
+
+        try:
+            future = self.server.batcher.submit(question, tenant=tenant, priority=priority)
+        except ValueError as e:
+            self._send_json(400, {"error": "Invalid request", "details": str(e)})
+            return
+        except queue.Full:
+            self._send_json(429, {"error": "Queue full", "details": "Service is saturated, retry later"},
+                            headers={"Retry-After": "1"})
+            return
+
+        try:
+            result = future.result(timeout=self.server.request_timeout)
+        except TimeoutError:
+            # Drop the item if it has not started, so it does not use an LLM slot for a caller that left
+            future.cancel()
+            self._send_json(504, {"error": "Timed out waiting for result"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": "Failed to process question", "details": str(e)})
+            return
+        self._send_json(200, result)
+
+    def address_string(self) -> str:
+        # Unix socket peers have no host/port pair
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class UnixHTTPServer(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server listening on a Unix domain socket."""
+    address_family = socket.AF_UNIX
+    daemon_threads = True
+
+    def server_bind(self):
+        TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def create_server(
+        batcher: MicroBatcher,
+        host: str = DEFAULT_SERVICE_HOST,
+        port: int = DEFAULT_SERVICE_PORT,
+        socket_path: Optional[str] = None,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT
+) -> HTTPServer:
+    """Create an HTTP server on a TCP port, or on a Unix socket when ``socket_path`` is set."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, ModerationRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ModerationRequestHandler)
+    server.batcher = batcher
+    server.request_timeout = request_timeout
+    return server
+
+
+def build_batcher(config: Dict[str, Any]) -> MicroBatcher:
+    """Load the index and LLM client once and wrap them in a micro-batcher."""
+    from main import RAGClient, create_embedding, setup_vectorstore
+
+    service_config = config.get("service", {})
+    logger.info("Loading vector store and clients for service mode")
+    client = RAGClient()
+    embedding = create_embedding()
+    warmup_threads = start_warmup(client.llm, embedding)
+    vectorstore_config = config.get("vectorstore", {})
+    vectorstore = setup_vectorstore(
+        config["data_sources"]["urls"],
+        embedding,
+        num_shards=vectorstore_config.get("shards", 0),
+        index_dir=vectorstore_config.get("index_dir", "index"),
+        chunk_workers=vectorstore_config.get("chunk_workers")
+    )
+    k = config.get("retriever", {}).get("k", DEFAULT_TOP_K)
+    if vectorstore_config.get("shards", 0) >= 1:
+        retriever = vectorstore.as_retriever(k=k)
+    else:
+        retriever = BatchRetriever(vectorstore, embedding, k)
+    for thread in warmup_threads:
+        thread.join()
+    logger.info(PROFILE.format_report())
+
+    scheduler_config = config.get("scheduler", {})
+    rate_limiters = build_rate_limiters(scheduler_config.get("rate_limits"))
+    max_batch_size = service_config.get("max_batch_size", DEFAULT_MAX_BATCH_SIZE)
+    if "llm" in rate_limiters:
+        client = RateLimitedClient(client, rate_limiters["llm"])
+    if "embedder" in rate_limiters:
+        retriever = RateLimitedRetriever(retriever, rate_limiters["embedder"])
+    max_queue_size = service_config.get("max_queue_size", DEFAULT_MAX_QUEUE_SIZE)
+
+    pregrader = None
+    pregrader_config = config.get("pregrader", {})
+    if pregrader_config.get("enabled") and os.path.exists(pregrader_config.get("model_path", "")):
+        from pregrader import PreGrader
+        pregrader = PreGrader.load(pregrader_config["model_path"], embedding, pregrader_config.get("confidence"))
+        logger.info(f"Loaded pre-graders for {', '.join(pregrader.models)}")
+
+    process_fn, recorder = process_question, None
+    record_path = config.get("tracing", {}).get("record_path")
+    if record_path:
+        from tracing import TraceRecorder
+        recorder = TraceRecorder(record_path)
+        process_fn = recorder.wrap(process_fn)
+        logger.info(f"Recording request traces to {record_path}")
+
+    return MicroBatcher(
+        retriever=retriever,
+        client=client,
+        process_fn=process_fn,
+        max_batch_size=max_batch_size,
+        batch_window_ms=service_config.get("batch_window_ms", DEFAULT_BATCH_WINDOW_MS),
+        max_queue_size=max_queue_size,
+        llm_concurrency=service_config.get("llm_concurrency", DEFAULT_LLM_CONCURRENCY),
+        work_queue=FairQueue(max_queue_size, scheduler_config.get("tenant_weights")),
+        context_variables={"search_rate_limiter": rate_limiters.get("search"), "pregrader": pregrader},
+        trace_recorder=recorder
+    )
+
+
+def main():
+    """Run the moderation service until interrupted."""
+    parser = argparse.ArgumentParser(description="Resident content moderation service")
+    parser.add_argument("--config", default=str(CONFIG_PATH), help="Path to config.yaml")
+    parser.add_argument("--host", help="Host to bind (TCP mode)")
+    parser.add_argument("--port", type=int, help="Port to bind (TCP mode)")
+    parser.add_argument("--socket", dest="socket_path", help="Unix socket path (overrides host/port)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    service_config = config.get("service", {})
+    batcher = build_batcher(config).start()
+    server = create_server(
+        batcher,
+        host=args.host or service_config.get("host", DEFAULT_SERVICE_HOST),
+        port=args.port or service_config.get("port", DEFAULT_SERVICE_PORT),
+        socket_path=args.socket_path or service_config.get("socket_path"),
+        request_timeout=service_config.get("request_timeout", DEFAULT_REQUEST_TIMEOUT)
+    )
+
+    logger.info(f"Moderation service listening on {server.server_address}")
+    print(f"Moderation service listening on {server.server_address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
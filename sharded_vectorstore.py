@@ -0,0 +1,248 @@
+import heapq
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from loguru import logger
+from arena import ChunkArena, ChunkArenaWriter
+from constants import DEFAULT_TOP_K
+from vectorstore import embed_queries
+
+MANIFEST_FILE = "index.json"
+VECTORS_FILE = "vectors.f32"
+EMBEDDING_BATCH_SIZE = 64
+
+# Per-process cache of memory-mapped shards, filled lazily in each worker
+_WORKER_INDEX_DIR: Optional[Path] = None
+_WORKER_MANIFEST: Dict[str, Any] = {}
+_WORKER_SHARDS: Dict[int, np.ndarray] = {}
+
+
+def _shard_dir(index_dir: Path, shard_id: int) -> Path:
+    return index_dir / f"shard_{shard_id:03d}"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _load_vectors(index_dir: Path, shard_id: int, count: int, dimension: int) -> np.ndarray:
+    if count == 0:
+        return np.zeros((0, dimension), dtype=np.float32)
+    # mmap keeps one copy of the shard in the page cache, shared by every worker
+    return np.memmap(_shard_dir(index_dir, shard_id) / VECTORS_FILE, dtype=np.float32, mode="r",
+                     shape=(count, dimension))
+
+
+def _init_worker(index_dir: str) -> None:
+    global _WORKER_INDEX_DIR
+    _WORKER_INDEX_DIR = Path(index_dir)
+    with open(_WORKER_INDEX_DIR / MANIFEST_FILE) as f:
+        _WORKER_MANIFEST.update(json.load(f))
+    _WORKER_SHARDS.clear()
+
+
+def _shard_vectors(shard_id: int) -> np.ndarray:
+    if shard_id not in _WORKER_SHARDS:
+        _WORKER_SHARDS[shard_id] = _load_vectors(
+            _WORKER_INDEX_DIR, shard_id, _WORKER_MANIFEST["counts"][shard_id], _WORKER_MANIFEST["dimension"]
+        )
+    return _WORKER_SHARDS[shard_id]
+
+
+class _ShardWriter:
+    """Append normalised vectors and chunk text to one shard."""
+
+    def __init__(self, shard_dir: Path):
+        self.arena = ChunkArenaWriter(shard_dir)
+        self.vector_file = open(shard_dir / VECTORS_FILE, "wb")
+        self.count = 0
+
+    def add(self, vector: np.ndarray, text: str, metadata: Dict[str, Any]) -> None:
+        self.vector_file.write(vector.tobytes())
+        self.arena.add(text, metadata)
+        self.count += 1
+
+    def close(self) -> None:
+        self.vector_file.close()
+        self.arena.close()
+
+
+def _search_shard(shard_id: int, queries: np.ndarray, k: int) -> List[List[Tuple[float, int, int]]]:
+    """Return the top-k (score, shard id, row) hits of one shard for each query."""
+    vectors = _shard_vectors(shard_id)
+    if len(vectors) == 0:
+        return [[] for _ in range(len(queries))]
+
+    scores = queries @ vectors.T
+    k = min(k, vectors.shape[0])
+    results = []
+    for row in scores:
+        top = np.argpartition(-row, k - 1)[:k]
+        top = top[np.argsort(-row[top])]
+        results.append([(float(row[i]), shard_id, int(i)) for i in top])
+    return results
+
+
+class ShardedRetriever:
+    """Retriever over a sharded index, mirroring ``vectorstore.as_retriever(k=...)``."""
+
+    def __init__(self, vectorstore: "ShardedVectorStore", k: int = DEFAULT_TOP_K):
+        self.vectorstore = vectorstore
+        self.k = k
+
+    def invoke(self, query: str) -> List[Any]:
+        return self.vectorstore.similarity_search(query, k=self.k)
+
+    def batch(self, queries: Sequence[str]) -> List[List[Any]]:
+        return self.vectorstore.similarity_search_batch(queries, k=self.k)
+
+
+class ShardedVectorStore:
+    """Cosine-similarity vector store partitioned across worker processes.
+
+    Each shard is a normalised float32 matrix in a raw file that the workers
+    memory map. A query is sent to every shard in parallel and the
+    per-shard top-k lists are merged in the calling process. Chunk text and
+    metadata live in a per-shard ``ChunkArena``; only the merged hits are
+    turned into ``Document`` objects.
+    """
+
+    def __init__(self, index_dir: Any, embedding: Any = None, num_workers: Optional[int] = None):
+        self.index_dir = Path(index_dir)
+        self.embedding = embedding
+        with open(self.index_dir / MANIFEST_FILE) as f:
+            self.manifest = json.load(f)
+        self.num_shards = self.manifest["num_shards"]
+        self.num_workers = num_workers or min(self.num_shards, os.cpu_count() or 1)
+        self.arenas = [ChunkArena(_shard_dir(self.index_dir, shard_id)) for shard_id in range(self.num_shards)]
+        self._executor = None
+
+    @classmethod
+    def from_documents(
+            cls,
+            documents: Iterable[Any],
+            embedding: Any,
+            index_dir: Any,
+            num_shards: int,
+            batch_size: int = EMBEDDING_BATCH_SIZE
+    ) -> "ShardedVectorStore":
+        """Embed documents in batches as they arrive and stream them into a sharded index.
+
+        ``documents`` may be a generator (see ``data_loader.iter_chunks``); only
+        one batch of chunks is held in memory at a time.
+        """
+        def embedded_batches():
+            batch = []
+            for doc in documents:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    yield batch, embedding.embed_documents([doc.page_content for doc in batch])
+                    batch = []
+            if batch:
+                yield batch, embedding.embed_documents([doc.page_content for doc in batch])
+
+        records = (
+            ({"page_content": doc.page_content, "metadata": doc.metadata}, vector)
+            for batch, vectors in embedded_batches()
+            for doc, vector in zip(batch, vectors)
+        )
+        return cls._write(records, index_dir, num_shards, embedding)
+
+    @classmethod
+    def from_embeddings(
+            cls,
+            records: Sequence[Dict[str, Any]],
+            vectors: Any,
+            index_dir: Any,
+            num_shards: int,
+            embedding: Any = None
+    ) -> "ShardedVectorStore":
+        """Write precomputed embeddings and their documents as a sharded index."""
+        return cls._write(zip(records, vectors), index_dir, num_shards, embedding)
+
+    @classmethod
+    def _write(
+            cls,
+            records: Iterable[Tuple[Dict[str, Any], Any]],
+            index_dir: Any,
+            num_shards: int,
+            embedding: Any
+    ) -> "ShardedVectorStore":
+        index_dir = Path(index_dir)
+        writers = []
+        for shard_id in range(num_shards):
+            shard_dir = _shard_dir(index_dir, shard_id)
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            writers.append(_ShardWriter(shard_dir))
+
+        dimension = 0
+        try:
+            for row, (record, vector) in enumerate(records):
+                vector = _normalize(vector)
+                dimension = vector.shape[-1]
+                # Round-robin keeps shards balanced without knowing the corpus size up front
+                writers[row % num_shards].add(vector, record["page_content"], record["metadata"])
+        finally:
+            for writer in writers:
+                writer.close()
+
+        counts = [writer.count for writer in writers]
+        logger.info(f"Wrote {sum(counts)} vectors to {num_shards} shards in {index_dir}")
+        with open(index_dir / MANIFEST_FILE, "w") as f:
+            json.dump({"num_shards": num_shards, "dimension": int(dimension), "counts": counts}, f)
+        return cls(index_dir, embedding=embedding)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(str(self.index_dir),)
+            )
+        return self._executor
+
+    def search_by_vectors(self, vectors: Any, k: int = DEFAULT_TOP_K) -> List[List[Tuple[float, int, int]]]:
+        """Fan queries out to every shard and merge the per-shard top-k results."""
+        queries = _normalize(np.atleast_2d(vectors))
+        futures = [self._pool().submit(_search_shard, shard_id, queries, k) for shard_id in range(self.num_shards)]
+        per_shard = [future.result() for future in futures]
+
+        merged = []
+        for query_index in range(len(queries)):
+            candidates = (hit for shard in per_shard for hit in shard[query_index])
+            merged.append(heapq.nlargest(k, candidates, key=lambda hit: hit[0]))
+        return merged
+
+    def similarity_search_by_vector(self, vector: Any, k: int = DEFAULT_TOP_K) -> List[Any]:
+        return [self.arenas[shard_id].document(row) for _, shard_id, row in self.search_by_vectors(vector, k)[0]]
+
+    def similarity_search(self, query: str, k: int = DEFAULT_TOP_K) -> List[Any]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search_batch(self, queries: Iterable[str], k: int = DEFAULT_TOP_K) -> List[List[Any]]:
+        vectors = embed_queries(self.embedding, queries)
+        if not vectors:
+            return []
+        return [
+            [self.arenas[shard_id].document(row) for _, shard_id, row in hits]
+            for hits in self.search_by_vectors(vectors, k)
+        ]
+
+    def as_retriever(self, k: int = DEFAULT_TOP_K, **kwargs) -> ShardedRetriever:
+        return ShardedRetriever(self, k=kwargs.get("search_kwargs", {}).get("k", k))
+
+    def close(self) -> None:
+        """Shut down the worker processes and unmap the chunk arenas."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for arena in self.arenas:
+            arena.close()
@@ -0,0 +1,87 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+
+class StartupProfile:
+    """Record how long each startup phase (imports, warm-up, index loading) takes."""
+
+    def __init__(self):
+        self._created = time.perf_counter()
+        self._phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block and add it to the named phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._phases[name] = self._phases.get(name, 0.0) + elapsed
+
+    def timings(self) -> Dict[str, float]:
+        """Return a copy of the recorded phase durations in seconds."""
+        with self._lock:
+            return dict(self._phases)
+
+    def format_report(self) -> str:
+        """Format the phase breakdown, grouped by kind, for logging or printing."""
+        timings = self.timings()
+        lines = ["Startup time report:"]
+        for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {name:<45} {seconds:8.3f}s")
+        imports = sum(seconds for name, seconds in timings.items() if name.startswith("import "))
+        warmup = sum(seconds for name, seconds in timings.items() if name.startswith("warm-up "))
+        lines.append(f"  {'imports (total)':<45} {imports:8.3f}s")
+        lines.append(f"  {'warm-up (total, in background)':<45} {warmup:8.3f}s")
+        lines.append(f"  {'wall clock since start':<45} {time.perf_counter() - self._created:8.3f}s")
+        return "\n".join(lines)
+
+
+PROFILE = StartupProfile()
+
+
+def lazy_import(module_name: str, attribute: Optional[str] = None) -> Any:
+    """Import a module on first use, recording the import cost in the startup profile."""
+    module = sys.modules.get(module_name)
+    if module is None:
+        with PROFILE.phase(f"import {module_name}"):
+            module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+
+def _warm_up(name: str, fn) -> None:
+    try:
+        with PROFILE.phase(f"warm-up {name}"):
+            fn()
+        logger.info(f"Warm-up of {name} finished")
+    except Exception as e:
+        logger.warning(f"Warm-up of {name} failed: {str(e)}")
+
+
+def start_warmup(llm: Any = None, embedding: Any = None) -> List[threading.Thread]:
+    """Load the LLM and embedding models in background threads.
+
+    The first real call otherwise pays the model-load latency inline; running
+    a throwaway request now lets that overlap with document loading.
+    """
+    threads = []
+    if llm is not None:
+        threads.append(threading.Thread(
+            target=_warm_up, args=("llm", lambda: llm.invoke("ping")), name="warm-up-llm", daemon=True
+        ))
+    if embedding is not None:
+        threads.append(threading.Thread(
+            target=_warm_up, args=("embedder", lambda: embedding.embed_query("warm-up")),
+            name="warm-up-embedder", daemon=True
+        ))
+    for thread in threads:
+        thread.start()
+    return threads
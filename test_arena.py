@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from arena import ChunkArena, ChunkArenaWriter
+
+
+class TestChunkArena(unittest.TestCase):
+    """Test cases for arena-backed chunk storage."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.page = {"source": "https://www.un.org/en/climatechange/what-is-climate-change", "title": "Climate"}
+        with ChunkArenaWriter(self.tmp.name) as writer:
+            writer.add("Climate change refers to long-term shifts.", self.page)
+            writer.add("Température et météo — non-ASCII text.", self.page)
+            writer.add("Sea turtles are marine reptiles.", {"source": "https://www.noaa.gov", "title": "Marine"})
+        self.arena = ChunkArena(self.tmp.name)
+
+    def tearDown(self):
+        self.arena.close()
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """Text and metadata come back exactly as written."""
+        self.assertEqual(len(self.arena), 3)
+        self.assertEqual(self.arena.text(1), "Température et météo — non-ASCII text.")
+        self.assertEqual(self.arena.metadata(2)["title"], "Marine")
+
+    def test_metadata_is_interned(self):
+        """Chunks from the same page share one metadata entry."""
+        self.assertEqual(len(self.arena.metadata_table), 2)
+        self.assertEqual(self.arena.metadata_ids[0], self.arena.metadata_ids[1])
+
+    def test_document_is_built_on_demand(self):
+        """Documents carry their own copy of the shared metadata."""
+        doc = self.arena.document(0)
+        self.assertEqual(doc.page_content, "Climate change refers to long-term shifts.")
+        doc.metadata["title"] = "changed"
+        self.assertEqual(self.arena.metadata(1)["title"], "Climate")
+
+    def test_empty_arena(self):
+        """An arena with no chunks can still be opened."""
+        with tempfile.TemporaryDirectory() as directory:
+            ChunkArenaWriter(directory).close()
+            arena = ChunkArena(directory)
+            self.assertEqual(len(arena), 0)
+            arena.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import importlib.util
+import unittest
+from data_loader import iter_chunks
+
+
+def word_length(text):
+    """Offline stand-in for the tiktoken counter; module level so worker processes can import it."""
+    return len(text.split())
+
+
+def tiktoken_available():
+    if importlib.util.find_spec("tiktoken") is None:
+        return False
+    try:
+        import tiktoken
+        tiktoken.get_encoding("gpt2")
+        return True
+    except Exception:
+        return False
+
+
+def make_documents():
+    from langchain_core.documents import Document
+    paragraph = ("Climate change refers to long-term shifts in temperatures and weather patterns. "
+                 "Such shifts can be natural, due to changes in the sun's activity or large volcanic eruptions. ")
+    return [
+        Document(page_content=(paragraph * (20 + i)) + "\n\n" + ("Sea turtles are marine reptiles. " * 15 * i),
+                 metadata={"source": f"https://example.org/{i}", "title": f"Page {i}"})
+        for i in range(5)
+    ]
+
+
+class TestIterChunks(unittest.TestCase):
+    """Streaming chunking must reproduce the original split_documents boundaries."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.documents = make_documents()
+
+    def expected(self, chunk_size, chunk_overlap):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                  length_function=word_length)
+        return [(doc.page_content, doc.metadata) for doc in splitter.split_documents(self.documents)]
+
+    def test_single_process_matches_split_documents(self):
+        """In-process streaming gives the same chunks in the same order."""
+        chunks = iter_chunks(iter(self.documents), chunk_size=100, chunk_overlap=20, processes=1,
+                             length_function=word_length)
+        self.assertEqual([(doc.page_content, doc.metadata) for doc in chunks], self.expected(100, 20))
+
+    def test_parallel_matches_split_documents(self):
+        """Splitting across processes keeps boundaries, overlap and document order."""
+        chunks = [(doc.page_content, doc.metadata) for doc in iter_chunks(
+            iter(self.documents), chunk_size=100, chunk_overlap=20, processes=2, length_function=word_length
+        )]
+        self.assertEqual(chunks, self.expected(100, 20))
+        first, second = chunks[0][0], chunks[1][0]
+        self.assertEqual(chunks[0][1], chunks[1][1])
+        self.assertIn(" ".join(first.split()[-10:]), second)
+
+
+@unittest.skipUnless(tiktoken_available(), "tiktoken gpt2 encoding not available")
+class TestTiktokenChunks(unittest.TestCase):
+    """The cached token counter must measure length exactly like from_tiktoken_encoder."""
+
+    def test_matches_from_tiktoken_encoder(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        documents = make_documents()
+        splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=100, chunk_overlap=20)
+        expected = [(doc.page_content, doc.metadata) for doc in splitter.split_documents(documents)]
+        chunks = iter_chunks(iter(documents), chunk_size=100, chunk_overlap=20, processes=1)
+        self.assertEqual([(doc.page_content, doc.metadata) for doc in chunks], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from graders import GradingProcessor, VerdictCache, split_sentences
+
+
+class ScriptedLLM:
+    """Returns a verdict per numbered claim, recording every prompt."""
+
+    def __init__(self, unsupported=(), skip=()):
+        self.prompts = []
+        self.unsupported = unsupported
+        self.skip = skip
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        claims = prompt.split("CLAIMS FROM STUDENT ANSWER:")[1].split("Return ONLY")[0]
+        verdicts = []
+        for line in claims.strip().splitlines():
+            number, _, sentence = line.strip().partition(". ")
+            if sentence in self.skip and "\n2. " in claims:
+                continue
+            score = "no" if sentence in self.unsupported else "yes"
+            verdicts.append({"id": int(number), "binary_score": score, "explanation": f"checked {number}"})
+        return SimpleNamespace(content=json.dumps({"verdicts": verdicts}))
+
+
+class TestClaimLevelHallucination(unittest.TestCase):
+    """Test cases for sentence-level hallucination grading with verdict reuse."""
+
+    def setUp(self):
+        patcher = patch("graders.JSONProcessor.setup_logging")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.processor = GradingProcessor(verdict_cache=VerdictCache())
+        self.facts = "Climate change refers to long-term shifts in temperatures and weather patterns."
+
+    def test_split_sentences(self):
+        """Answers are split on sentence-ending punctuation."""
+        self.assertEqual(split_sentences("One. Two!  Three?"), ["One.", "Two!", "Three?"])
+
+    def test_only_new_sentences_are_graded(self):
+        """A regenerated answer sends only its new sentences to the LLM."""
+        llm = ScriptedLLM()
+        client = SimpleNamespace(llm=llm)
+        first = self.processor.grade_hallucination_claims(client, self.facts, "Climate changes. Temperatures shift.")
+        self.assertEqual(first["binary_score"], "yes")
+
+        second = self.processor.grade_hallucination_claims(client, self.facts, "Climate changes. Weather shifts too.")
+        self.assertEqual(len(llm.prompts), 2)
+        self.assertNotIn("Climate changes.", llm.prompts[1].split("CLAIMS FROM STUDENT ANSWER:")[1])
+        self.assertEqual([claim["cached"] for claim in second["claims"]], [True, False])
+
+        self.processor.grade_hallucination_claims(client, self.facts, "Climate changes. Weather shifts too.")
+        self.assertEqual(len(llm.prompts), 2)
+
+    def test_different_sources_are_not_reused(self):
+        """Verdicts are keyed by the supporting chunks as well as the sentence."""
+        llm = ScriptedLLM()
+        client = SimpleNamespace(llm=llm)
+        self.processor.grade_hallucination_claims(client, self.facts, "Climate changes.")
+        self.processor.grade_hallucination_claims(client, "Sea turtles are reptiles.", "Climate changes.")
+        self.assertEqual(len(llm.prompts), 2)
+
+    def test_result_order_does_not_change_cache_key(self):
+        """Search results passed as a list hit the cache regardless of their order."""
+        llm = ScriptedLLM()
+        client = SimpleNamespace(llm=llm)
+        results = [self.facts, "Sea turtles are reptiles."]
+        self.processor.grade_hallucination_claims(client, results, "Climate changes.")
+        self.processor.grade_hallucination_claims(client, results[::-1], "Climate changes.")
+        self.assertEqual(len(llm.prompts), 1)
+
+    def test_empty_answer_uses_whole_answer_grader(self):
+        """An answer with no sentences is graded by the LLM instead of passing with zero claims."""
+        llm = SimpleNamespace(prompts=[])
+
+        def invoke(prompt):
+            llm.prompts.append(prompt)
+            return SimpleNamespace(content='{"binary_score": "no", "explanation": "empty answer"}')
+
+        llm.invoke = invoke
+        result = self.processor.grade_hallucination_claims(SimpleNamespace(llm=llm), self.facts, "  \n ")
+        self.assertEqual(result["binary_score"], "no")
+        self.assertIn("STUDENT ANSWER:", llm.prompts[0])
+        self.assertNotIn("CLAIMS FROM STUDENT ANSWER:", llm.prompts[0])
+
+    def test_unsupported_claim_fails_overall(self):
+        """One unsupported sentence makes the whole answer fail, naming the sentence."""
+        client = SimpleNamespace(llm=ScriptedLLM(unsupported={"Sea turtles fly."}))
+        result = self.processor.grade_hallucination_claims(client, self.facts, "Climate changes. Sea turtles fly.")
+        self.assertEqual(result["binary_score"], "no")
+        self.assertIn("Sea turtles fly.", result["explanation"])
+
+    def test_skipped_claims_are_regraded_individually(self):
+        """Claims missing from the batch answer get their own call."""
+        llm = ScriptedLLM(skip={"Temperatures shift."})
+        client = SimpleNamespace(llm=llm)
+        result = self.processor.grade_hallucination_claims(client, self.facts, "Climate changes. Temperatures shift.")
+        self.assertEqual(result["binary_score"], "yes")
+        self.assertEqual(len(llm.prompts), 2)
+
+    def test_llm_error_is_not_cached(self):
+        """A failed call returns "no" and leaves the cache untouched."""
+        class FailingLLM:
+            def invoke(self, prompt):
+                raise RuntimeError("backend down")
+
+        result = self.processor.grade_hallucination_claims(SimpleNamespace(llm=FailingLLM()), self.facts, "Climate changes.")
+        self.assertEqual(result["binary_score"], "no")
+        self.assertEqual(len(self.processor.verdict_cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
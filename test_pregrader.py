@@ -0,0 +1,133 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from loguru import logger
+from graders import GradingProcessor, VERDICT_LOG_MARKER, VERDICT_LOG_MAX_CHARS
+from pregrader import PreGrader, extract_features, read_verdicts, train
+
+
+FACTS = ("Sea turtles are marine reptiles found in oceans worldwide. There are seven species of sea turtles. "
+         "They migrate long distances between feeding and nesting grounds.")
+SUPPORTED = ["There are seven species of sea turtles.", "Sea turtles are marine reptiles.",
+             "Sea turtles migrate long distances.", "They are found in oceans worldwide."]
+UNSUPPORTED = ["Sea turtles can live for 400 years on land.", "Penguins fly across deserts in 1999.",
+               "Volcanic eruptions cause 80 percent of rainfall.", "Stock markets doubled in 2021."]
+
+
+def synthetic_records(count=80):
+    rng = random.Random(0)
+    records = []
+    for i in range(count):
+        supported = i % 2 == 0
+        text = rng.choice(SUPPORTED if supported else UNSUPPORTED)
+        records.append({"grader": "claim", "context": FACTS, "text": text, "binary_score": "yes" if supported else "no"})
+    return records
+
+
+class StubPreGrader:
+    def __init__(self, prediction):
+        self.prediction = prediction
+
+    def predict(self, grader, context, text):
+        return self.prediction
+
+
+class StubEmbedding:
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content='{"binary_score": "yes", "explanation": "relevant"}')
+
+
+class TestPreGrader(unittest.TestCase):
+    """Test cases for training and gating with local pre-graders."""
+
+    def setUp(self):
+        patcher = patch("graders.JSONProcessor.setup_logging")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_read_verdicts_skips_legacy_lines(self):
+        """Only structured verdict lines are used for training."""
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as f:
+            f.write("2024-11-02 09:44:27 | DEBUG | Parsed JSON result: {'binary_score': 'yes'}\n")
+            for record in synthetic_records(3):
+                f.write(f"2024-11-02 09:44:27 | INFO | {VERDICT_LOG_MARKER}{json.dumps(record)}\n")
+        self.addCleanup(os.unlink, f.name)
+        records = read_verdicts([f.name, "missing.log"])
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]["grader"], "claim")
+
+    def test_features_match_logged_truncation(self):
+        """Long serving inputs give the same features as their truncated training logs."""
+        context = "sea turtles migrate across oceans " * 500
+        claim = "Sea turtles migrate."
+        self.assertGreater(len(context), VERDICT_LOG_MAX_CHARS)
+        self.assertEqual(extract_features(context, claim), extract_features(context[:VERDICT_LOG_MAX_CHARS], claim))
+
+    def test_train_reports_escalation_and_agreement(self):
+        """Training on separable verdicts gives a gate that agrees with the LLM."""
+        pregrader, report = train(synthetic_records(), confidence=0.8)
+        self.assertIn("claim", pregrader.models)
+        self.assertEqual(report["claim"]["held_out"], 20)
+        self.assertGreaterEqual(report["claim"]["agreement_overall"], 0.9)
+        self.assertLess(report["claim"]["escalation_rate"], 1.0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pregraders.pkl")
+            pregrader.save(path)
+            loaded = PreGrader.load(path)
+        self.assertEqual(loaded.predict("claim", FACTS, SUPPORTED[0])[0], "yes")
+        self.assertIsNone(loaded.predict("answer", "question", "answer"))
+
+    def test_lexical_model_ignores_supplied_embedder(self):
+        """A model trained without embeddings still predicts when loaded with the service's embedder."""
+        pregrader, _ = train(synthetic_records(), confidence=0.8)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pregraders.pkl")
+            pregrader.save(path)
+            loaded = PreGrader.load(path, StubEmbedding())
+        self.assertEqual(loaded.predict("claim", FACTS, SUPPORTED[0])[0], "yes")
+
+    def test_too_few_verdicts_are_skipped(self):
+        """Graders without enough labelled samples get no model."""
+        pregrader, report = train(synthetic_records(6))
+        self.assertEqual(pregrader.models, {})
+        self.assertEqual(report, {})
+
+    def test_confident_pre_grade_skips_llm(self):
+        """A confident pre-grader answers without calling the LLM."""
+        llm = RecordingLLM()
+        processor = GradingProcessor(pregrader=StubPreGrader(("no", 0.97)))
+        result = processor.grade_document(SimpleNamespace(llm=llm), "document", "question")
+        self.assertEqual(result["binary_score"], "no")
+        self.assertEqual(llm.prompts, [])
+
+    def test_uncertain_items_escalate_and_are_logged(self):
+        """Uncertain items go to the LLM and its verdict is logged for training."""
+        messages = []
+        sink = logger.add(messages.append, format="{message}")
+        self.addCleanup(logger.remove, sink)
+        llm = RecordingLLM()
+        processor = GradingProcessor(pregrader=StubPreGrader(None))
+        result = processor.grade_answer(SimpleNamespace(llm=llm), "what is climate change", "Long-term shifts.")
+        self.assertEqual(result["binary_score"], "yes")
+        self.assertEqual(len(llm.prompts), 1)
+        logged = [json.loads(m.split(VERDICT_LOG_MARKER)[1]) for m in messages if VERDICT_LOG_MARKER in m]
+        self.assertEqual(logged, [{"grader": "answer", "context": "what is climate change",
+                                   "text": "Long-term shifts.", "binary_score": "yes"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import queue
+import threading
+import time
+import unittest
+from service import MicroBatcher, WorkItem
+from scheduler import FairQueue, TokenBucket, RateLimitedClient, RateLimitedRetriever
+
+
+class FakeLLM:
+    def invoke(self, prompt):
+        return prompt
+
+
+class FakeClient:
+    def __init__(self):
+        self.llm = FakeLLM()
+
+    def invoke(self, prompt):
+        return prompt
+
+
+class FakeRetriever:
+    def batch(self, questions):
+        return [[] for _ in questions]
+
+
+class TestFairQueue(unittest.TestCase):
+    """Test cases for priority classes and per-tenant fair share."""
+
+    def drain(self, fair_queue):
+        items = []
+        while fair_queue.qsize():
+            items.append(fair_queue.get(timeout=0))
+        return items
+
+    def test_urgent_items_skip_ahead_of_backfill(self):
+        """Higher priority classes are always served first."""
+        fair_queue = FairQueue()
+        for i in range(3):
+            fair_queue.put_nowait(WorkItem(question=f"backfill {i}", priority="batch"))
+        fair_queue.put_nowait(WorkItem(question="report", priority="normal"))
+        fair_queue.put_nowait(WorkItem(question="harassment campaign", priority="urgent"))
+        order = [item.question for item in self.drain(fair_queue)]
+        self.assertEqual(order[:2], ["harassment campaign", "report"])
+        self.assertEqual(order[2:], ["backfill 0", "backfill 1", "backfill 2"])
+
+    def test_noisy_tenant_shares_by_weight(self):
+        """A tenant with a large backlog does not starve others."""
+        fair_queue = FairQueue(tenant_weights={"premium": 2.0})
+        for i in range(6):
+            fair_queue.put_nowait(WorkItem(question=f"noisy {i}", tenant="noisy"))
+        for i in range(4):
+            fair_queue.put_nowait(WorkItem(question=f"premium {i}", tenant="premium"))
+        fair_queue.put_nowait(WorkItem(question="quiet 0", tenant="quiet"))
+        tenants = [item.tenant for item in self.drain(fair_queue)]
+        self.assertIn("quiet", tenants[:4])
+        self.assertEqual(tenants[:7].count("premium"), 4)
+
+    def test_capacity_and_unknown_class(self):
+        """A full queue raises queue.Full; unknown classes are rejected."""
+        fair_queue = FairQueue(maxsize=1)
+        fair_queue.put_nowait(WorkItem(question="a"))
+        with self.assertRaises(queue.Full):
+            fair_queue.put_nowait(WorkItem(question="b", priority="urgent"))
+        with self.assertRaises(ValueError):
+            FairQueue().put_nowait(WorkItem(question="c", priority="whenever"))
+        with self.assertRaises(queue.Empty):
+            FairQueue().get(timeout=0.01)
+
+    def test_put_blocks_until_space(self):
+        """A blocking put waits for a get to free a slot, or times out."""
+        fair_queue = FairQueue(maxsize=1)
+        fair_queue.put(WorkItem(question="a"))
+        with self.assertRaises(queue.Full):
+            fair_queue.put(WorkItem(question="b"), timeout=0.05)
+        threading.Timer(0.05, fair_queue.get).start()
+        fair_queue.put(WorkItem(question="c"), timeout=5)
+        self.assertEqual(fair_queue.get(timeout=0).question, "c")
+
+    def test_wait_time_reported_per_class(self):
+        """Items contribute to their class's wait statistics once processing starts."""
+        fair_queue = FairQueue()
+        fair_queue.put_nowait(WorkItem(question="a", priority="urgent", enqueued_at=time.monotonic() - 0.5))
+        item = fair_queue.get()
+        self.assertEqual(fair_queue.stats()["urgent"]["served"], 0)
+        fair_queue.mark_started(item)
+        stats = fair_queue.stats()
+        self.assertEqual(stats["urgent"]["served"], 1)
+        self.assertGreaterEqual(stats["urgent"]["wait_ms_max"], 500)
+        self.assertEqual(stats["batch"]["served"], 0)
+
+
+class TestBatcherPriority(unittest.TestCase):
+    """Test cases for priority ordering through the micro-batcher."""
+
+    def test_urgent_item_is_not_stuck_behind_collected_backfill(self):
+        """Items stay queued until an LLM slot is free, so a late urgent item runs next."""
+        order, release = [], threading.Event()
+
+        def process(question, retriever, client, context_variables=None):
+            release.wait(5)
+            order.append(question)
+            return {"answer": question}
+
+        batcher = MicroBatcher(FakeRetriever(), FakeClient(), process_fn=process, max_batch_size=8,
+                               batch_window_ms=50, llm_concurrency=1, work_queue=FairQueue()).start()
+        futures = [batcher.submit(f"backfill {i}", priority="batch") for i in range(12)]
+        time.sleep(0.2)
+        futures.append(batcher.submit("urgent", priority="urgent"))
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        batcher.stop()
+        self.assertEqual(order.index("urgent"), 1)
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test cases for per-backend rate limits."""
+
+    def test_burst_then_refill(self):
+        """The bucket allows a burst, then refills at the configured rate."""
+        bucket = TokenBucket(rate=20, capacity=2)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+        start = time.monotonic()
+        self.assertTrue(bucket.acquire(timeout=1))
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+        self.assertFalse(bucket.acquire(tokens=2, timeout=0.01))
+
+    def test_request_above_capacity_fails_fast(self):
+        """Asking for more tokens than the bucket holds raises instead of waiting forever."""
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=4).acquire(8)
+
+    def test_rate_limited_retriever_batch_larger_than_burst(self):
+        """A retrieval batch larger than the embedder burst draws tokens per question."""
+        retriever = RateLimitedRetriever(FakeRetriever(), TokenBucket(rate=100, capacity=2))
+        self.assertEqual(len(retriever.batch([f"q{i}" for i in range(4)])), 4)
+
+    def test_rate_limited_client_draws_tokens(self):
+        """Both client.invoke and client.llm.invoke consume LLM tokens."""
+        bucket = TokenBucket(rate=0.001, capacity=2)
+        client = RateLimitedClient(FakeClient(), bucket)
+        self.assertEqual(client.llm.invoke("a"), "a")
+        self.assertEqual(client.invoke("b"), "b")
+        self.assertFalse(bucket.try_acquire())
+
+
+if __name__ == '__main__':
+    unittest.main()
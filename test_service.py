@@ -0,0 +1,170 @@
+import json
+import queue
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from service import MicroBatcher, create_server
+from vectorstore import BatchRetriever
+
+
+class FakeRetriever:
+    """Retriever that records how questions were grouped into batches."""
+
+    def __init__(self):
+        self.batches = []
+
+    def batch(self, questions):
+        self.batches.append(list(questions))
+        return [[f"doc for {question}"] for question in questions]
+
+    def invoke(self, question):
+        return [f"doc for {question}"]
+
+
+def echo_process(question, retriever, client, context_variables=None):
+    return {"answer": question, "documents": retriever.invoke(question)}
+
+
+class TestMicroBatcher(unittest.TestCase):
+    """Test cases for service-mode batching and backpressure."""
+
+    def test_items_within_window_share_a_batch(self):
+        """Items queued together are retrieved in a single batch call."""
+        retriever = FakeRetriever()
+        batcher = MicroBatcher(retriever, client=None, process_fn=echo_process,
+                               max_batch_size=4, batch_window_ms=200)
+        futures = [batcher.submit(f"q{i}") for i in range(3)]
+        batcher.start()
+        results = [future.result(timeout=5) for future in futures]
+        batcher.stop()
+
+        self.assertEqual(retriever.batches, [["q0", "q1", "q2"]])
+        self.assertEqual(results[1], {"answer": "q1", "documents": ["doc for q1"]})
+        self.assertEqual(batcher.stats()["completed"], 3)
+
+    def test_cancelled_items_are_skipped(self):
+        """Items cancelled while queued are neither retrieved nor processed."""
+        retriever = FakeRetriever()
+        batcher = MicroBatcher(retriever, client=None, process_fn=echo_process,
+                               max_batch_size=4, batch_window_ms=200, llm_concurrency=3)
+        futures = [batcher.submit(f"q{i}") for i in range(3)]
+        self.assertTrue(futures[1].cancel())
+        batcher.start()
+        futures[0].result(timeout=5)
+        futures[2].result(timeout=5)
+        batcher.stop()
+
+        self.assertEqual(retriever.batches, [["q0", "q2"]])
+        self.assertEqual(batcher.stats()["cancelled"], 1)
+        self.assertEqual(batcher.stats()["completed"], 2)
+
+    def test_full_queue_rejects_items(self):
+        """Submitting past the queue limit raises queue.Full."""
+        batcher = MicroBatcher(FakeRetriever(), client=None, process_fn=echo_process, max_queue_size=2)
+        batcher.submit("q0")
+        batcher.submit("q1")
+        with self.assertRaises(queue.Full):
+            batcher.submit("q2")
+        self.assertEqual(batcher.stats()["rejected"], 1)
+        self.assertEqual(batcher.stats()["queue_depth"], 2)
+
+    def test_saturated_backend_applies_backpressure(self):
+        """A blocked LLM slot makes the queue fill up instead of growing without bound."""
+        release = threading.Event()
+
+        def blocking_process(question, retriever, client, context_variables=None):
+            release.wait(5)
+            return {"answer": question}
+
+        batcher = MicroBatcher(FakeRetriever(), client=None, process_fn=blocking_process,
+                               max_batch_size=1, batch_window_ms=0, max_queue_size=1,
+                               llm_concurrency=1).start()
+        first = batcher.submit("q0")
+        accepted = [first]
+        with self.assertRaises(queue.Full):
+            for i in range(1, 10):
+                accepted.append(batcher.submit(f"q{i}"))
+                threading.Event().wait(0.05)
+        release.set()
+        for future in accepted:
+            future.result(timeout=5)
+        batcher.stop()
+
+
+class FakeEmbedding:
+    """Embedder that records each call and maps text to its length."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class FakeVectorStore:
+    """Store that, like SKLearnVectorStore, only searches by vector through MMR."""
+
+    def similarity_search_by_vector(self, vector, k=4):
+        raise NotImplementedError
+
+    def max_marginal_relevance_search_by_vector(self, vector, k=4, fetch_k=20, lambda_mult=0.5):
+        return [f"doc {vector[0]:.0f}"] * k
+
+
+class TestBatchRetriever(unittest.TestCase):
+    """Test cases for batched query embedding."""
+
+    def test_batch_embeds_questions_once(self):
+        """A batch of questions costs one embedding call and one vector search each."""
+        embedding = FakeEmbedding()
+        retriever = BatchRetriever(FakeVectorStore(), embedding, k=2)
+        documents = retriever.batch(["a", "bb", "ccc"])
+        self.assertEqual(embedding.calls, [["a", "bb", "ccc"]])
+        self.assertEqual(documents, [["doc 1", "doc 1"], ["doc 2", "doc 2"], ["doc 3", "doc 3"]])
+        self.assertEqual(retriever.invoke("dddd"), ["doc 4", "doc 4"])
+
+
+class TestServiceEndpoints(unittest.TestCase):
+    """Test cases for the HTTP endpoints."""
+
+    def setUp(self):
+        self.batcher = MicroBatcher(FakeRetriever(), client=None, process_fn=echo_process).start()
+        self.server = create_server(self.batcher, host="127.0.0.1", port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.batcher.stop()
+
+    def test_health_and_queue(self):
+        """Health and queue-depth endpoints report service state."""
+        with urllib.request.urlopen(f"{self.base_url}/health") as response:
+            self.assertEqual(json.loads(response.read()), {"status": "ok"})
+        with urllib.request.urlopen(f"{self.base_url}/queue") as response:
+            self.assertEqual(json.loads(response.read())["queue_depth"], 0)
+
+    def test_moderate(self):
+        """Posting a question returns the processed result."""
+        request = urllib.request.Request(
+            f"{self.base_url}/moderate",
+            data=json.dumps({"question": "what is climate change"}).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request) as response:
+            self.assertEqual(json.loads(response.read())["answer"], "what is climate change")
+
+    def test_bad_request(self):
+        """A body without a question is rejected."""
+        request = urllib.request.Request(f"{self.base_url}/moderate", data=b"{}")
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            urllib.request.urlopen(request)
+        self.assertEqual(ctx.exception.code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+import numpy as np
+from sharded_vectorstore import ShardedVectorStore
+
+
+class FakeEmbedding:
+    """Maps a query string to a fixed vector."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.batch_sizes = []
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+    def embed_documents(self, texts):
+        self.batch_sizes.append(len(texts))
+        return [self.vectors[text] for text in texts]
+
+
+class TestShardedVectorStore(unittest.TestCase):
+    """Test cases for sharded search and top-k merging."""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(42)
+        cls.vectors = rng.standard_normal((50, 16)).astype(np.float32)
+        cls.records = [{"page_content": f"chunk {i}", "metadata": {"row": i}} for i in range(50)]
+        cls.query = rng.standard_normal(16).astype(np.float32)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.store = ShardedVectorStore.from_embeddings(
+            cls.records, cls.vectors, cls.tmp.name, num_shards=4,
+            embedding=FakeEmbedding({"q": cls.query})
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.store.close()
+        cls.tmp.cleanup()
+
+    def expected_rows(self, query, k):
+        normalized = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        return list(np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:k])
+
+    def test_merged_results_match_brute_force(self):
+        """Merging per-shard top-k gives the global top-k."""
+        hits = self.store.search_by_vectors(self.query, k=5)[0]
+        rows = [self.store.arenas[shard_id].metadata(row)["row"] for _, shard_id, row in hits]
+        self.assertEqual(rows, self.expected_rows(self.query, 5))
+        scores = [score for score, _, _ in hits]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_batch_queries(self):
+        """Several queries fan out in one round trip per shard."""
+        queries = np.stack([self.query, self.vectors[7]])
+        results = self.store.search_by_vectors(queries, k=3)
+        self.assertEqual(len(results), 2)
+        _, shard_id, row = results[1][0]
+        self.assertEqual(self.store.arenas[shard_id].text(row), "chunk 7")
+
+    def test_retriever_interface(self):
+        """as_retriever(k=...) returns documents like the in-process store."""
+        docs = self.store.as_retriever(k=3).invoke("q")
+        self.assertEqual([doc.metadata["row"] for doc in docs], self.expected_rows(self.query, 3))
+        self.assertEqual(docs[0].page_content, f"chunk {docs[0].metadata['row']}")
+
+    def test_single_shard_arena_mode(self):
+        """One shard gives the arena-backed index the same results as the in-process search."""
+        with tempfile.TemporaryDirectory() as index_dir:
+            store = ShardedVectorStore.from_embeddings(self.records, self.vectors, index_dir, num_shards=1,
+                                                       embedding=FakeEmbedding({"q": self.query}))
+            try:
+                docs = store.as_retriever(k=3).invoke("q")
+            finally:
+                store.close()
+        self.assertEqual([doc.metadata["row"] for doc in docs], self.expected_rows(self.query, 3))
+
+    def test_from_documents_streams_in_batches(self):
+        """A generator of chunks is embedded batch by batch into the shards."""
+        from langchain_core.documents import Document
+        embedding = FakeEmbedding({f"chunk {i}": self.vectors[i] for i in range(50)})
+        chunks = (Document(page_content=f"chunk {i}", metadata={"row": i}) for i in range(50))
+        with tempfile.TemporaryDirectory() as index_dir:
+            store = ShardedVectorStore.from_documents(chunks, embedding, index_dir, num_shards=3, batch_size=16)
+            try:
+                self.assertEqual(embedding.batch_sizes, [16, 16, 16, 2])
+                self.assertEqual(store.manifest["counts"], [17, 17, 16])
+                hits = store.search_by_vectors(self.query, k=4)[0]
+                rows = [store.arenas[shard_id].metadata(row)["row"] for _, shard_id, row in hits]
+                self.assertEqual(rows, self.expected_rows(self.query, 4))
+            finally:
+                store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import sys
+import threading
+import unittest
+from startup import StartupProfile, PROFILE, lazy_import, start_warmup
+
+
+class FakeModel:
+    """Stands in for ChatOllama / NomicEmbeddings during warm-up."""
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, prompt):
+        self.calls.append(("invoke", prompt))
+
+    def embed_query(self, text):
+        self.calls.append(("embed_query", text))
+
+
+class TestStartupProfile(unittest.TestCase):
+    """Test cases for startup timing and warm-up."""
+
+    def test_phases_accumulate(self):
+        """Repeated phases with the same name are summed."""
+        profile = StartupProfile()
+        with profile.phase("load documents"):
+            pass
+        with profile.phase("load documents"):
+            pass
+        self.assertEqual(list(profile.timings()), ["load documents"])
+        self.assertIn("load documents", profile.format_report())
+
+    def test_lazy_import_records_first_import_only(self):
+        """Only a real import is timed; cached modules are returned directly."""
+        sys.modules.pop("colorsys", None)
+        module = lazy_import("colorsys")
+        self.assertIs(lazy_import("colorsys"), module)
+        self.assertIn("import colorsys", PROFILE.timings())
+        self.assertIs(lazy_import("colorsys", "rgb_to_hsv"), module.rgb_to_hsv)
+
+    def test_warmup_runs_in_background(self):
+        """Both models receive a throwaway request from background threads."""
+        llm, embedding = FakeModel(), FakeModel()
+        threads = start_warmup(llm, embedding)
+        for thread in threads:
+            self.assertIsInstance(thread, threading.Thread)
+            thread.join(5)
+        self.assertEqual(llm.calls, [("invoke", "ping")])
+        self.assertEqual(embedding.calls, [("embed_query", "warm-up")])
+        self.assertIn("warm-up llm", PROFILE.timings())
+
+
+if __name__ == '__main__':
+    unittest.main()
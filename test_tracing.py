@@ -0,0 +1,143 @@
+import json
+import os
+import re
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from langchain_core.documents import Document
+from graders import GradingProcessor, VerdictCache
+from processor import process_question
+from replay import ReplayBackends, load_traces, run_replay
+from scheduler import RateLimitedClient, TokenBucket
+from service import PrefetchedRetriever
+from tracing import TraceRecorder
+
+
+class FakeLLM:
+    """Answers generation, grading and claim prompts after a short delay."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        if "CLAIMS FROM STUDENT ANSWER" in prompt:
+            ids = re.findall(r"^\s*(\d+)\. ", prompt.split("CLAIMS FROM STUDENT ANSWER:")[1], re.MULTILINE)
+            verdicts = [{"id": int(i), "binary_score": "yes", "explanation": "supported"} for i in ids]
+            return SimpleNamespace(content=json.dumps({"verdicts": verdicts}))
+        if "Return ONLY a single JSON object" in prompt:
+            return SimpleNamespace(content='{"binary_score": "yes", "explanation": "relevant"}')
+        return SimpleNamespace(content="Tracing answer about reptiles. They swim in the ocean.")
+
+
+class FakeRetriever:
+    def invoke(self, question):
+        return [
+            Document(page_content="Trace chunk one about oceans.", metadata={"source": "https://example.org/a"}),
+            Document(page_content=f"Trace chunk about {question}.", metadata={"source": "https://example.org/b"})
+        ]
+
+
+class TestTraceRecordAndReplay(unittest.TestCase):
+    """Test cases for recording pipeline traces and replaying them offline."""
+
+    def setUp(self):
+        patcher = patch("graders.JSONProcessor.setup_logging")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "trace.jsonl.gz")
+
+        self.llm = FakeLLM()
+        recorder = TraceRecorder(self.path)
+        recorded = recorder.wrap(process_question)
+        client = SimpleNamespace(llm=self.llm)
+        context_variables = {"verdict_cache": VerdictCache()}
+        self.results = [
+            recorded(question, FakeRetriever(), client, context_variables)
+            for question in ("turtles", "whales", "turtles")
+        ]
+        recorder.close()
+
+    def test_trace_contents(self):
+        """Each request records retrieval, LLM calls and timings; chunks are stored once."""
+        traces = load_traces(self.path)
+        self.assertEqual(len(traces["requests"]), 3)
+        self.assertEqual(len(traces["chunks"]), 3)
+        first = traces["requests"][0]
+        self.assertEqual(first["question"], "turtles")
+        self.assertEqual(first["outcome"], "answer")
+        self.assertEqual([event["stage"] for event in first["events"]][0], "retrieval")
+        self.assertGreaterEqual(sum(event["stage"] == "llm" for event in first["events"]), 3)
+        self.assertGreater(first["total_latency"], 0)
+
+    def test_stand_ins_answer_from_trace(self):
+        """Recorded prompts get recorded responses; unknown prompts are counted as misses."""
+        traces = load_traces(self.path)
+        backends = ReplayBackends(traces, latency_scale=0)
+        event = next(e for e in traces["requests"][0]["events"] if e["stage"] == "llm")
+        self.assertEqual(backends.invoke_llm(event["prompt"]).content, event["response"])
+        backends.invoke_llm("a prompt nobody recorded")
+        self.assertEqual(backends.misses["llm"], 1)
+        self.assertEqual(backends.retrieve("whales")[1].page_content, "Trace chunk about whales.")
+
+    def test_claim_prompt_miss_keeps_batch_shape(self):
+        """A missed claim-batch prompt gets one verdict per claim instead of per-claim retries."""
+        backends = ReplayBackends(load_traces(self.path), latency_scale=0)
+        verdicts = GradingProcessor(verdict_cache=VerdictCache())._grade_claims(
+            backends.client(), "Unrecorded facts.", ["First claim.", "Second claim.", "Third claim."]
+        )
+        self.assertEqual([verdict["binary_score"] for verdict in verdicts], ["yes"] * 3)
+        self.assertEqual(backends.misses["llm"], 1)
+
+    def test_rate_limit_waits_are_not_recorded_as_latency(self):
+        """LLM calls throttled by a token bucket are recorded with the backend's own latency."""
+        path = os.path.join(self.tmp.name, "limited.jsonl")
+        recorder = TraceRecorder(path)
+        client = RateLimitedClient(SimpleNamespace(llm=self.llm), TokenBucket(rate=5, capacity=1))
+        recorder.wrap(process_question)("turtles", FakeRetriever(), client, {"verdict_cache": VerdictCache()})
+        recorder.close()
+        latencies = [e["latency"] for e in load_traces(path)["requests"][0]["events"] if e["stage"] == "llm"]
+        self.assertGreaterEqual(len(latencies), 3)
+        self.assertLess(max(latencies), 0.1)
+
+    def test_truncated_gzip_trace_keeps_complete_records(self):
+        """A trace from a killed worker, missing its gzip end-of-stream marker, is still readable."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        truncated = os.path.join(self.tmp.name, "killed.jsonl.gz")
+        with open(truncated, "wb") as f:
+            f.write(data[:-10])
+        traces = load_traces(truncated)
+        self.assertEqual([request["question"] for request in traces["requests"]], ["turtles", "whales", "turtles"])
+
+    def test_prefetched_retrieval_latency_is_recorded(self):
+        """Documents prefetched by the service batcher are recorded with the batch retrieval cost."""
+        path = os.path.join(self.tmp.name, "service.jsonl")
+        recorder = TraceRecorder(path)
+        docs = FakeRetriever().invoke("turtles")
+        recorder.wrap(process_question)("turtles", PrefetchedRetriever(docs, 0.25), SimpleNamespace(llm=self.llm),
+                                        {"verdict_cache": VerdictCache()})
+        recorder.close()
+        retrieval = load_traces(path)["requests"][0]["events"][0]
+        self.assertEqual(retrieval["stage"], "retrieval")
+        self.assertEqual(retrieval["latency"], 0.25)
+
+    def test_replay_without_live_backends(self):
+        """Replay drives process_question from the trace with recorded latencies."""
+        calls_before = self.llm.calls
+        summary = run_replay(load_traces(self.path), rate=50, concurrency=2, repeat=2)
+        self.assertEqual(summary["requests"], 6)
+        self.assertEqual(summary["errors"], 0)
+        self.assertEqual(summary["misses"], {})
+        self.assertGreaterEqual(summary["latency_p50"], self.llm.delay)
+        self.assertEqual(self.llm.calls, calls_before)
+
+
+if __name__ == '__main__':
+    unittest.main()
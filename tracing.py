@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+from processor import process_question
+from scheduler import limiter_wait_time
+
+
+def content_id(text: str) -> str:
+    """Stable id for a chunk or prompt, based on its content."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def open_trace(path: str, mode: str):
+    """Open a trace file, gzip-compressed when the name ends in ``.gz``."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class RequestTrace:
+    """Events recorded while one question goes through the pipeline."""
+
+    def __init__(self, question: str):
+        self.question = question
+        self.chunk_ids: List[str] = []
+        self.events: List[Dict[str, Any]] = []
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append(event)
+
+
+def _backend_latency(start: float, waited: float) -> float:
+    """Time since ``start``, minus any token-bucket wait since ``limiter_wait_time()`` was ``waited``."""
+    return time.perf_counter() - start - (limiter_wait_time() - waited)
+
+
+def _record_llm_call(trace: RequestTrace, invoke: Callable, prompt: Any, *args, **kwargs):
+    start, waited = time.perf_counter(), limiter_wait_time()
+    response = invoke(prompt, *args, **kwargs)
+    trace.add({
+        "stage": "llm",
+        "prompt": prompt if isinstance(prompt, str) else str(prompt),
+        "response": response.content,
+        "latency": _backend_latency(start, waited)
+    })
+    return response
+
+
+class _RecordingLLM:
+    def __init__(self, llm: Any, trace: RequestTrace):
+        self._llm = llm
+        self._trace = trace
+
+    def invoke(self, prompt: Any, *args, **kwargs):
+        return _record_llm_call(self._trace, self._llm.invoke, prompt, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+
+class _RecordingClient:
+    def __init__(self, client: Any, trace: RequestTrace):
+        self._client = client
+        self._trace = trace
+        self.llm = _RecordingLLM(client.llm, trace)
+
+    def invoke(self, prompt: Any, *args, **kwargs):
+        return _record_llm_call(self._trace, self._client.invoke, prompt, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _RecordingRetriever:
+    def __init__(self, retriever: Any, trace: RequestTrace, recorder: "TraceRecorder"):
+        self._retriever = retriever
+        self._trace = trace
+        self._recorder = recorder
+
+    def invoke(self, question: str):
+        start, waited = time.perf_counter(), limiter_wait_time()
+        docs = self._retriever.invoke(question)
+        # Documents prefetched by the service batcher carry the batch retrieval cost
+        latency = getattr(self._retriever, "prefetch_latency", None)
+        if latency is None:
+            latency = _backend_latency(start, waited)
+        chunk_ids = [self._recorder.add_chunk(doc.page_content, doc.metadata) for doc in docs or []]
+        self._trace.chunk_ids = chunk_ids
+        self._trace.add({"stage": "retrieval", "query": question, "chunk_ids": chunk_ids, "latency": latency})
+        return docs
+
+
+class TraceRecorder:
+    """Append one JSON line per processed request to a trace file.
+
+    Chunk text is written once per file and referenced by id afterwards, so
+    traces stay compact when the same chunks are retrieved repeatedly.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open_trace(path, "a")
+        self._seen_chunks = set()
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def add_chunk(self, text: str, metadata: Dict[str, Any]) -> str:
+        chunk = content_id(text)
+        with self._lock:
+            if chunk not in self._seen_chunks:
+                self._seen_chunks.add(chunk)
+                self._write({"type": "chunk", "id": chunk, "text": text, "metadata": metadata})
+        return chunk
+
+    def wrap(self, process_fn: Callable[..., Dict[str, Any]] = process_question) -> Callable[..., Dict[str, Any]]:
+        """Return a ``process_question``-compatible function that records each call."""
+        def recorded(question: str, retriever: Any, client: Any, context_variables: Optional[Dict] = None):
+            trace = RequestTrace(question)
+            context_variables = dict(context_variables or {})
+            search_fn = context_variables.get("search_fn")
+
+            def recorded_search(query: str):
+                if search_fn is None:
+                    from search import search_web
+                    run_search = search_web
+                else:
+                    run_search = search_fn
+                start = time.perf_counter()
+                results = run_search(query)
+                trace.add({"stage": "search", "query": query, "results": results,
+                           "latency": time.perf_counter() - start})
+                return results
+
+            # _search_web waits on the search rate limiter before calling this, so it is not timed
+            context_variables["search_fn"] = recorded_search
+            start = time.perf_counter()
+            result = process_fn(
+                question=question,
+                retriever=_RecordingRetriever(retriever, trace, self),
+                client=_RecordingClient(client, trace),
+                context_variables=context_variables
+            )
+            self.record(trace, time.perf_counter() - start, result)
+            return result
+
+        return recorded
+
+    def record(self, trace: RequestTrace, total_latency: float, result: Dict[str, Any]) -> None:
+        outcome = next((key for key in ("error", "warning", "answer") if key in result), "unknown")
+        with self._lock:
+            self._count += 1
+            self._write({
+                "type": "request",
+                "id": self._count,
+                "question": trace.question,
+                "started_at": trace.started_at,
+                "chunk_ids": trace.chunk_ids,
+                "events": trace.events,
+                "total_latency": total_latency,
+                "outcome": outcome
+            })
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+        logger.info(f"Recorded {self._count} request traces to {self.path}")
@@ -1,13 +1,52 @@
-from langchain_community.vectorstores import SKLearnVectorStore
-from langchain_nomic.embeddings import NomicEmbeddings
+from typing import Any, List, Sequence
+from constants import DEFAULT_TOP_K
+from startup import lazy_import
 
 
 def create_vectorstore(documents, embedding_model="nomic-embed-text-v1.5"):
     """Create and return a vector store from documents."""
+    SKLearnVectorStore = lazy_import("langchain_community.vectorstores", "SKLearnVectorStore")
+    NomicEmbeddings = lazy_import("langchain_nomic.embeddings", "NomicEmbeddings")
     return SKLearnVectorStore.from_documents(
         documents=documents,
         embedding=NomicEmbeddings(
             model=embedding_model,
             inference_mode="local"
         )
-    )
\ No newline at end of file
+    )
+
+
+def embed_queries(embedding: Any, queries: Sequence[str]) -> List[List[float]]:
+    """Embed several search queries with a single call to the embedder."""
+    queries = list(queries)
+    if not queries:
+        return []
+    if hasattr(embedding, "embed"):
+        # Nomic prefixes queries and documents differently; keep the query task type
+        return embedding.embed(queries, task_type="search_query")
+    return embedding.embed_documents(queries)
+
+
+class BatchRetriever:
+    """Retriever that embeds a batch of questions in one call and searches by vector."""
+
+    def __init__(self, vectorstore: Any, embedding: Any, k: int = DEFAULT_TOP_K):
+        self.vectorstore = vectorstore
+        self.embedding = embedding
+        self.k = k
+
+    def invoke(self, question: str) -> List[Any]:
+        return self.batch([question])[0]
+
+    def batch(self, questions: Sequence[str]) -> List[List[Any]]:
+        return [self._search_by_vector(vector) for vector in embed_queries(self.embedding, questions)]
+
+    def _search_by_vector(self, vector: List[float]) -> List[Any]:
+        try:
+            return self.vectorstore.similarity_search_by_vector(vector, k=self.k)
+        except NotImplementedError:
+            # SKLearnVectorStore only searches by vector through MMR; lambda_mult=1
+            # with fetch_k=k returns the plain top-k neighbours
+            return self.vectorstore.max_marginal_relevance_search_by_vector(
+                vector, k=self.k, fetch_k=self.k, lambda_mult=1.0
+            )